@@ -2,38 +2,67 @@
 """
 Script para importar inventario inicial desde Excel
 Almacén Satelital San Luis
+
+Uso:
+    python importar_inventario_inicial.py                      (elige el archivo de la carpeta)
+    python importar_inventario_inicial.py archivo.xlsx
+    python importar_inventario_inicial.py archivo.csv --por-bloques [--bloque 5000] [--reiniciar]
+    python importar_inventario_inicial.py carpeta/ [--procesos 4]   (varios archivos)
+    python importar_inventario_inicial.py "entregas/*.xlsx"
+
+Con --por-bloques el archivo (XLSX o CSV) se lee de a bloques sin cargarlo completo en
+memoria, cada bloque se confirma por separado y el avance se guarda en un archivo
+.checkpoint.json: si la importación se interrumpe, al volver a ejecutarla continúa
+desde el último bloque confirmado.
+
+Con una carpeta o un patrón (glob) se importan todos los archivos sin preguntar: se leen
+y validan en paralelo en varios procesos y un único proceso escribe en la base de datos.
 """
 
+import argparse
+import glob
+import itertools
+import json
 import pandas as pd
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine, Base
 from models import Producto, Movimiento, Unidad, Grupo
+from stock import inicializar_stock_lote
+from cache import incrementar_version
 from datetime import datetime, date
 
+COLUMNAS_ESPERADAS = ['Codigo', 'Nombre', 'Unidad', 'Grupo', 'Cantidad Inicial']
+
+# Filas por bloque en la importación por bloques
+TAMANO_BLOQUE = 5000
+
+# Errores que se muestran en pantalla en la importación por bloques (el resto solo se cuenta)
+MAX_ERRORES_EN_PANTALLA = 50
+
 def validar_archivo_excel(archivo_excel):
-    """Validar que el archivo Excel existe y tiene la estructura correcta"""
+    """Validar que el archivo existe"""
     if not os.path.exists(archivo_excel):
         print(f"❌ Error: No se encontró el archivo {archivo_excel}")
         return False
-    
-    try:
-        # Leer solo la primera fila para validar columnas
-        df_test = pd.read_excel(archivo_excel, nrows=1)
-        columnas_esperadas = ['Codigo', 'Nombre', 'Unidad', 'Grupo', 'Cantidad Inicial']
-        
-        for col in columnas_esperadas:
-            if col not in df_test.columns:
-                print(f"❌ Error: Falta la columna '{col}' en el archivo Excel")
-                print(f"📋 Columnas encontradas: {list(df_test.columns)}")
-                return False
-        
-        print("✅ Archivo Excel validado correctamente")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error al leer el archivo Excel: {e}")
+    return True
+
+def columnas_faltantes(columnas):
+    """Columnas esperadas que no están en el encabezado"""
+    return [col for col in COLUMNAS_ESPERADAS if col not in columnas]
+
+def validar_columnas(columnas):
+    """Validar que el archivo tiene las columnas esperadas (se llama con el encabezado ya leído)"""
+    for col in columnas_faltantes(columnas):
+        print(f"❌ Error: Falta la columna '{col}' en el archivo")
+        print(f"📋 Columnas encontradas: {list(columnas)}")
         return False
+    
+    print("✅ Archivo validado correctamente")
+    return True
 
 def obtener_mapas_referencia(db):
     """Obtener mapas de unidades y grupos existentes"""
@@ -55,79 +84,127 @@ def obtener_mapas_referencia(db):
     
     return mapa_unidades, mapa_grupos
 
-def procesar_fila(fila, mapa_unidades, mapa_grupos, db, errores):
-    """Procesar una fila del Excel y crear producto + movimiento"""
-    try:
-        # Obtener datos de la fila
-        codigo = str(fila['Codigo']).strip()
-        nombre = str(fila['Nombre']).strip()
-        unidad_str = str(fila['Unidad']).strip()
-        grupo_str = str(fila['Grupo']).strip()
-        cantidad_inicial = float(fila['Cantidad Inicial']) if pd.notna(fila['Cantidad Inicial']) else 0.0
-        
-        # Validar datos básicos
-        if not codigo or codigo == 'nan':
-            errores.append(f"Fila sin código válido: {fila.to_dict()}")
-            return False
-        
-        if not nombre or nombre == 'nan':
-            errores.append(f"Producto {codigo}: Sin nombre válido")
-            return False
-        
-        # Buscar unidad
-        unidad_id = None
-        unidad_key = unidad_str.lower()
-        if unidad_key in mapa_unidades:
-            unidad_id = mapa_unidades[unidad_key]
-        else:
-            errores.append(f"Producto {codigo}: Unidad '{unidad_str}' no encontrada")
-            return False
-        
-        # Buscar grupo
-        grupo_id = None
-        grupo_key = grupo_str.lower()
-        if grupo_key in mapa_grupos:
-            grupo_id = mapa_grupos[grupo_key]
-        else:
-            errores.append(f"Producto {codigo}: Grupo '{grupo_str}' no encontrado")
-            return False
-        
-        # Verificar si el producto ya existe
-        producto_existente = db.query(Producto).filter(Producto.codigo == codigo).first()
-        if producto_existente:
-            errores.append(f"Producto {codigo}: Ya existe en la base de datos")
-            return False
-        
-        # Crear producto
-        producto = Producto(
-            codigo=codigo,
-            nombre=nombre,
-            unidad_id=unidad_id,
-            grupo_id=grupo_id,
-            stock_minimo=0.0,  # Se puede ajustar manualmente después
-            activo=True
-        )
-        db.add(producto)
-        db.flush()  # Para obtener el ID del producto
-        
-        # Crear movimiento de entrada inicial si hay cantidad
-        # Usar producto_id en lugar de codigo_producto (corregido para nueva estructura)
-        if cantidad_inicial > 0:
-            movimiento = Movimiento(
-                producto_id=producto.id,
-                tipo="entrada",
-                cantidad=cantidad_inicial,
-                descripcion="Retorno de correctivos X14 del 17/09/2025)",
-                fecha=date.today()
-            )
-            db.add(movimiento)
-        
-        print(f"   ✅ {codigo} - {nombre} (Stock: {cantidad_inicial})")
-        return True
-        
-    except Exception as e:
-        errores.append(f"Error procesando fila {codigo if 'codigo' in locals() else 'desconocido'}: {str(e)}")
-        return False
+# Descripción de los movimientos de entrada del inventario inicial
+DESCRIPCION_MOVIMIENTO_INICIAL = "Retorno de correctivos X14 del 17/09/2025)"
+
+# Productos importados que se muestran en pantalla (el resto solo se cuenta)
+MAX_PRODUCTOS_EN_PANTALLA = 20
+
+def obtener_codigos_existentes(db):
+    """Códigos de productos ya registrados, en una sola consulta"""
+    return set(db.execute(select(Producto.codigo)).scalars())
+
+def texto_columna(serie):
+    """Columna como texto sin espacios ('' en celdas vacías)"""
+    return serie.where(serie.notna(), "").astype(str).str.strip()
+
+def validar_filas(df, mapa_unidades, mapa_grupos, codigos_existentes):
+    """Validar todas las filas a la vez con operaciones de pandas
+
+    Devuelve (validas, errores): un DataFrame con codigo, nombre, unidad_id, grupo_id y
+    cantidad de las filas correctas, y la lista de mensajes de las filas rechazadas.
+    """
+    datos = pd.DataFrame({
+        "codigo": texto_columna(df['Codigo']),
+        "nombre": texto_columna(df['Nombre']),
+        "unidad": texto_columna(df['Unidad']),
+        "grupo": texto_columna(df['Grupo']),
+    })
+    datos["unidad_id"] = datos["unidad"].str.lower().map(mapa_unidades)
+    datos["grupo_id"] = datos["grupo"].str.lower().map(mapa_grupos)
+    
+    cantidades = pd.to_numeric(df['Cantidad Inicial'], errors="coerce")
+    datos["cantidad"] = cantidades.fillna(0.0).astype(float)
+    
+    # La primera condición que se cumple es el error de la fila; un código repetido
+    # solo cuenta entre las filas que no tenían ya otro error
+    condiciones = [
+        lambda rechazadas: datos["codigo"].isin(["", "nan"]),
+        lambda rechazadas: datos["nombre"].isin(["", "nan"]),
+        lambda rechazadas: datos["unidad_id"].isna(),
+        lambda rechazadas: datos["grupo_id"].isna(),
+        lambda rechazadas: datos["codigo"].isin(codigos_existentes),
+        lambda rechazadas: datos["codigo"].where(~rechazadas).duplicated(),
+        lambda rechazadas: cantidades.isna() & df['Cantidad Inicial'].notna(),
+    ]
+    mensajes = [
+        lambda fila: f"Fila {fila.Index + 2}: sin código válido",
+        lambda fila: f"Producto {fila.codigo}: Sin nombre válido",
+        lambda fila: f"Producto {fila.codigo}: Unidad '{fila.unidad}' no encontrada",
+        lambda fila: f"Producto {fila.codigo}: Grupo '{fila.grupo}' no encontrado",
+        lambda fila: f"Producto {fila.codigo}: Ya existe en la base de datos",
+        lambda fila: f"Producto {fila.codigo}: Código repetido en el archivo",
+        lambda fila: f"Producto {fila.codigo}: Cantidad inicial no numérica",
+    ]
+    
+    errores = []
+    rechazadas = pd.Series(False, index=datos.index)
+    for condicion, mensaje in zip(condiciones, mensajes):
+        nuevas = condicion(rechazadas) & ~rechazadas
+        # Solo se recorren las filas con error para armar los mensajes
+        errores.extend(mensaje(fila) for fila in datos[nuevas].itertuples())
+        rechazadas |= nuevas
+    
+    validas = datos[~rechazadas].copy()
+    validas["unidad_id"] = validas["unidad_id"].astype(int)
+    validas["grupo_id"] = validas["grupo_id"].astype(int)
+    return validas, errores
+
+def insertar_productos(db, validas):
+    """Insertar productos, saldos y movimientos de entrada en pocos executemany
+
+    Devuelve la cantidad de movimientos creados. No hace commit.
+    """
+    if validas.empty:
+        return 0
+    
+    registros = validas[["codigo", "nombre", "unidad_id", "grupo_id"]].to_dict("records")
+    ahora = datetime.now()
+    ids = db.execute(
+        insert(Producto).returning(Producto.id, sort_by_parameter_order=True),
+        [{**registro, "stock_minimo": 0.0, "activo": True, "fecha_creacion": ahora} for registro in registros]
+    ).scalars().all()
+    
+    cantidades = [max(float(c), 0.0) for c in validas["cantidad"]]
+    
+    # Saldo materializado con la cantidad inicial
+    inicializar_stock_lote(db, dict(zip(ids, cantidades)))
+    
+    # Movimiento de entrada inicial para los productos con cantidad
+    movimientos = [
+        {
+            "producto_id": producto_id,
+            "tipo": "entrada",
+            "cantidad": cantidad,
+            "descripcion": DESCRIPCION_MOVIMIENTO_INICIAL,
+            "fecha": date.today(),
+            "fecha_creacion": ahora,
+        }
+        for producto_id, cantidad in zip(ids, cantidades)
+        if cantidad > 0
+    ]
+    if movimientos:
+        db.execute(insert(Movimiento), movimientos)
+    
+    # Invalida el resumen del dashboard del sistema en ejecución
+    incrementar_version(db, "productos", "movimientos")
+    return len(movimientos)
+
+def mostrar_productos_importados(validas):
+    """Mostrar los primeros productos importados"""
+    for fila in validas.head(MAX_PRODUCTOS_EN_PANTALLA).itertuples():
+        print(f"   ✅ {fila.codigo} - {fila.nombre} (Stock: {fila.cantidad})")
+    if len(validas) > MAX_PRODUCTOS_EN_PANTALLA:
+        print(f"   ... y {len(validas) - MAX_PRODUCTOS_EN_PANTALLA} productos más")
+
+def mostrar_tiempos(tiempos, filas):
+    """Resumen de tiempos por etapa"""
+    total = sum(tiempos.values())
+    print(f"\n⏱️  TIEMPOS")
+    print("-" * 30)
+    for etapa, segundos in tiempos.items():
+        print(f"   {etapa:<12} {segundos:8.2f}s")
+    print(f"   {'Total':<12} {total:8.2f}s ({filas / total if total else 0:,.0f} filas/s)")
 
 def importar_inventario_desde_excel(archivo_excel):
     """Función principal para importar inventario desde Excel"""
@@ -139,10 +216,16 @@ def importar_inventario_desde_excel(archivo_excel):
     if not validar_archivo_excel(archivo_excel):
         return False
     
+    tiempos = {}
+    
     # Leer archivo Excel
     try:
         print(f"📖 Leyendo archivo: {archivo_excel}")
+        inicio = time.perf_counter()
         df = pd.read_excel(archivo_excel)
+        tiempos["Lectura"] = time.perf_counter() - inicio
+        if not validar_columnas(df.columns):
+            return False
         print(f"📋 Productos encontrados en Excel: {len(df)}")
         
         if len(df) == 0:
@@ -155,28 +238,31 @@ def importar_inventario_desde_excel(archivo_excel):
     
     # Conectar a base de datos
     db = SessionLocal()
-    errores = []
-    productos_creados = 0
-    movimientos_creados = 0
     
     try:
-        # Obtener mapas de referencia
+        # Obtener mapas de referencia y códigos ya registrados
         print("\n🔍 Obteniendo datos de referencia...")
+        inicio = time.perf_counter()
         mapa_unidades, mapa_grupos = obtener_mapas_referencia(db)
+        codigos_existentes = obtener_codigos_existentes(db)
         
         print(f"\n📦 PROCESANDO {len(df)} PRODUCTOS")
         print("-" * 50)
         
-        # Procesar cada fila
-        for index, fila in df.iterrows():
-            if procesar_fila(fila, mapa_unidades, mapa_grupos, db, errores):
-                productos_creados += 1
-                # Contar movimientos (solo si hay cantidad inicial > 0)
-                if pd.notna(fila['Cantidad Inicial']) and float(fila['Cantidad Inicial']) > 0:
-                    movimientos_creados += 1
+        validas, errores = validar_filas(df, mapa_unidades, mapa_grupos, codigos_existentes)
+        tiempos["Validación"] = time.perf_counter() - inicio
+        
+        # Insertar todo y confirmar en una sola transacción
+        inicio = time.perf_counter()
+        movimientos_creados = insertar_productos(db, validas)
+        tiempos["Inserción"] = time.perf_counter() - inicio
         
-        # Confirmar cambios
+        inicio = time.perf_counter()
         db.commit()
+        tiempos["Commit"] = time.perf_counter() - inicio
+        
+        productos_creados = len(validas)
+        mostrar_productos_importados(validas)
         
         # Mostrar resultados
         print(f"\n🎯 RESULTADOS DE LA IMPORTACIÓN")
@@ -191,6 +277,8 @@ def importar_inventario_desde_excel(archivo_excel):
             for i, error in enumerate(errores, 1):
                 print(f"{i:2d}. {error}")
         
+        mostrar_tiempos(tiempos, len(df))
+        
         if productos_creados > 0:
             print(f"\n🚀 ¡INVENTARIO INICIAL IMPORTADO EXITOSAMENTE!")
             print(f"   El almacén satelital San Luis está listo con {productos_creados} productos")
@@ -204,11 +292,364 @@ def importar_inventario_desde_excel(archivo_excel):
     finally:
         db.close()
 
+# ===== IMPORTACIÓN POR BLOQUES =====
+
+def leer_bloques(archivo, tamano_bloque, saltar=0):
+    """Leer un XLSX (modo read_only) o un CSV de a bloques, sin cargarlo completo
+
+    Devuelve (columnas, bloques): cada bloque es (df, filas_leidas) con el índice igual
+    a la posición de la fila en el archivo y sin las filas vacías (que igual cuentan en
+    filas_leidas, para poder retomar desde la posición exacta). Se saltan las primeras
+    saltar filas de datos.
+    """
+    if archivo.lower().endswith(".csv"):
+        columnas = list(pd.read_csv(archivo, nrows=0, encoding="utf-8-sig").columns)
+        lector = pd.read_csv(
+            archivo,
+            dtype=str,
+            encoding="utf-8-sig",
+            skip_blank_lines=False,
+            skiprows=range(1, saltar + 1),
+            chunksize=tamano_bloque
+        )
+        
+        def bloques():
+            posicion = saltar
+            for df in lector:
+                df.index = range(posicion, posicion + len(df))
+                posicion += len(df)
+                yield df.dropna(how="all"), len(df)
+        
+        return columnas, bloques()
+    
+    from openpyxl import load_workbook
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    filas = libro.active.iter_rows(values_only=True)
+    columnas = [str(valor).strip() if valor is not None else "" for valor in next(filas, ())]
+    
+    def bloques():
+        try:
+            posicion = saltar
+            for _ in itertools.islice(filas, saltar):
+                pass
+            while True:
+                bloque = list(itertools.islice(filas, tamano_bloque))
+                if not bloque:
+                    break
+                df = pd.DataFrame(
+                    [fila[:len(columnas)] for fila in bloque],
+                    columns=columnas,
+                    index=range(posicion, posicion + len(bloque))
+                )
+                posicion += len(bloque)
+                yield df.dropna(how="all"), len(bloque)
+        finally:
+            libro.close()
+    
+    return columnas, bloques()
+
+def ruta_checkpoint(archivo):
+    """Archivo donde se guarda el avance de la importación de un archivo"""
+    return f"{archivo}.checkpoint.json"
+
+def firma_archivo(archivo):
+    """Tamaño y fecha de modificación: si cambian, el checkpoint ya no sirve"""
+    info = os.stat(archivo)
+    return {"tamano": info.st_size, "modificado": info.st_mtime}
+
+def leer_checkpoint(archivo):
+    """Avance guardado de una importación anterior del mismo archivo (o None)"""
+    try:
+        with open(ruta_checkpoint(archivo), encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if estado.get("firma") != firma_archivo(archivo):
+        print("⚠️  El archivo cambió desde la importación anterior: se empieza de cero")
+        return None
+    return estado
+
+def guardar_checkpoint(archivo, estado):
+    """Guardar el avance (escritura atómica: un corte no deja el archivo a medias)"""
+    temporal = ruta_checkpoint(archivo) + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta_checkpoint(archivo))
+
+def importar_inventario_por_bloques(archivo, tamano_bloque=TAMANO_BLOQUE, reiniciar=False):
+    """Importar un XLSX o CSV de a bloques, con commit y checkpoint por bloque"""
+    print("📊 IMPORTACIÓN DE INVENTARIO INICIAL POR BLOQUES")
+    print("   Almacén Satelital San Luis")
+    print("=" * 60)
+    
+    if not validar_archivo_excel(archivo):
+        return False
+    
+    estado = None if reiniciar else leer_checkpoint(archivo)
+    if estado:
+        print(f"↩️  Continuando desde la fila {estado['filas_procesadas'] + 1} (importación anterior interrumpida)")
+    else:
+        estado = {
+            "firma": firma_archivo(archivo),
+            "filas_procesadas": 0,
+            "productos_creados": 0,
+            "movimientos_creados": 0,
+            "errores": 0,
+        }
+    
+    try:
+        columnas, bloques = leer_bloques(archivo, tamano_bloque, saltar=estado["filas_procesadas"])
+    except Exception as e:
+        print(f"❌ Error al leer el archivo: {e}")
+        return False
+    if not validar_columnas(columnas):
+        return False
+    
+    db = SessionLocal()
+    inicio = time.perf_counter()
+    filas_sesion = 0
+    errores_mostrados = 0
+    
+    try:
+        print("\n🔍 Obteniendo datos de referencia...")
+        mapa_unidades, mapa_grupos = obtener_mapas_referencia(db)
+        codigos_existentes = obtener_codigos_existentes(db)
+        
+        print(f"\n📦 PROCESANDO EN BLOQUES DE {tamano_bloque} FILAS")
+        print("-" * 50)
+        
+        for numero, (df, filas_leidas) in enumerate(bloques, start=1):
+            validas, errores = validar_filas(df, mapa_unidades, mapa_grupos, codigos_existentes)
+            movimientos_creados = insertar_productos(db, validas)
+            db.commit()
+            
+            # El checkpoint se guarda después del commit: si se corta entre ambos, el bloque
+            # se vuelve a leer y sus productos se rechazan como "Ya existe"
+            codigos_existentes.update(validas["codigo"])
+            estado["filas_procesadas"] += filas_leidas
+            estado["productos_creados"] += len(validas)
+            estado["movimientos_creados"] += movimientos_creados
+            estado["errores"] += len(errores)
+            guardar_checkpoint(archivo, estado)
+            
+            for error in errores[:max(0, MAX_ERRORES_EN_PANTALLA - errores_mostrados)]:
+                print(f"   ⚠️  {error}")
+            errores_mostrados += len(errores)
+            
+            filas_sesion += filas_leidas
+            transcurrido = time.perf_counter() - inicio
+            print(
+                f"   ✅ Bloque {numero}: {estado['filas_procesadas']} filas procesadas, "
+                f"{len(validas)} productos nuevos, {len(errores)} errores "
+                f"({filas_sesion / transcurrido if transcurrido else 0:,.0f} filas/s)"
+            )
+        
+    except KeyboardInterrupt:
+        db.rollback()
+        print(f"\n🛑 Importación interrumpida: se retomará desde la fila {estado['filas_procesadas'] + 1}")
+        return False
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error durante la importación: {e}")
+        print(f"   Los bloques anteriores quedaron guardados; se retomará desde la fila {estado['filas_procesadas'] + 1}")
+        return False
+    finally:
+        db.close()
+    
+    # Importación completa: el checkpoint ya no se necesita
+    if os.path.exists(ruta_checkpoint(archivo)):
+        os.remove(ruta_checkpoint(archivo))
+    
+    transcurrido = time.perf_counter() - inicio
+    print(f"\n🎯 RESULTADOS DE LA IMPORTACIÓN")
+    print("=" * 50)
+    print(f"✅ Productos creados: {estado['productos_creados']}")
+    print(f"✅ Movimientos de entrada: {estado['movimientos_creados']}")
+    print(f"⚠️  Errores encontrados: {estado['errores']}")
+    if errores_mostrados > MAX_ERRORES_EN_PANTALLA:
+        print(f"   (se mostraron los primeros {MAX_ERRORES_EN_PANTALLA})")
+    print(f"⏱️  {filas_sesion} filas en {transcurrido:.2f}s ({filas_sesion / transcurrido if transcurrido else 0:,.0f} filas/s)")
+    
+    return estado["productos_creados"] > 0
+
+# ===== IMPORTACIÓN DE VARIOS ARCHIVOS EN PARALELO =====
+
+EXTENSIONES_IMPORTABLES = (".xlsx", ".xls", ".csv")
+
+# Datos de referencia de cada proceso lector (se cargan una vez al iniciar el proceso)
+_referencia_proceso = {}
+
+def buscar_archivos(origen):
+    """Archivos a importar desde una carpeta o un patrón glob, en orden alfabético"""
+    if os.path.isdir(origen):
+        candidatos = [os.path.join(origen, nombre) for nombre in os.listdir(origen)]
+    else:
+        candidatos = glob.glob(origen)
+    return sorted(
+        archivo for archivo in candidatos
+        if os.path.isfile(archivo) and archivo.lower().endswith(EXTENSIONES_IMPORTABLES)
+    )
+
+def leer_archivo(archivo):
+    """Leer un archivo completo (XLSX/XLS o CSV) como DataFrame"""
+    if archivo.lower().endswith(".csv"):
+        return pd.read_csv(archivo, dtype=str, encoding="utf-8-sig")
+    return pd.read_excel(archivo)
+
+def iniciar_proceso_lector(mapa_unidades, mapa_grupos, codigos_existentes):
+    """Inicializador del pool: recibe los datos de referencia una sola vez por proceso"""
+    _referencia_proceso.update(
+        mapa_unidades=mapa_unidades,
+        mapa_grupos=mapa_grupos,
+        codigos_existentes=codigos_existentes
+    )
+
+def leer_y_validar(archivo):
+    """Leer y validar un archivo en un proceso del pool (no usa la base de datos)"""
+    inicio = time.perf_counter()
+    try:
+        df = leer_archivo(archivo)
+    except Exception as e:
+        return {"archivo": archivo, "error": f"No se pudo leer: {e}"}
+    
+    faltantes = columnas_faltantes(df.columns)
+    if faltantes:
+        return {"archivo": archivo, "error": f"Faltan las columnas: {', '.join(faltantes)}"}
+    
+    validas, errores = validar_filas(
+        df,
+        _referencia_proceso["mapa_unidades"],
+        _referencia_proceso["mapa_grupos"],
+        _referencia_proceso["codigos_existentes"]
+    )
+    return {
+        "archivo": archivo,
+        "validas": validas,
+        "errores": errores,
+        "filas": len(df),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+def importar_varios_archivos(origen, procesos=None):
+    """Importar todos los archivos de una carpeta o patrón: lectura en paralelo, un solo escritor"""
+    print("📊 IMPORTACIÓN DE INVENTARIO INICIAL (VARIOS ARCHIVOS)")
+    print("   Almacén Satelital San Luis")
+    print("=" * 60)
+    
+    archivos = buscar_archivos(origen)
+    if not archivos:
+        print(f"❌ No se encontraron archivos .xlsx, .xls o .csv en: {origen}")
+        return False
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(archivos)))
+    print(f"📁 {len(archivos)} archivos, {procesos} procesos de lectura")
+    
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    totales = {"filas": 0, "productos": 0, "movimientos": 0, "errores": 0, "lectura": 0.0}
+    archivos_con_error = []
+    
+    try:
+        print("\n🔍 Obteniendo datos de referencia...")
+        mapa_unidades, mapa_grupos = obtener_mapas_referencia(db)
+        codigos_existentes = obtener_codigos_existentes(db)
+        
+        print(f"\n📦 PROCESANDO ARCHIVOS")
+        print("-" * 50)
+        
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            initializer=iniciar_proceso_lector,
+            initargs=(mapa_unidades, mapa_grupos, codigos_existentes)
+        ) as pool:
+            futuros = [pool.submit(leer_y_validar, archivo) for archivo in archivos]
+            
+            # Un solo escritor, en el orden de los archivos (como el modo secuencial): si un
+            # código está en dos archivos gana siempre el primero, sin importar qué lectura
+            # termine antes. Los demás archivos se siguen leyendo mientras tanto
+            for futuro in futuros:
+                resultado = futuro.result()
+                nombre = os.path.basename(resultado["archivo"])
+                if "error" in resultado:
+                    archivos_con_error.append(f"{nombre}: {resultado['error']}")
+                    print(f"   ❌ {nombre}: {resultado['error']}")
+                    continue
+                
+                # Los procesos no ven lo que importaron los otros archivos: se filtra aquí
+                validas = resultado["validas"]
+                errores = resultado["errores"]
+                repetidas = validas["codigo"].isin(codigos_existentes)
+                errores += [f"Producto {codigo}: Ya importado desde otro archivo" for codigo in validas.loc[repetidas, "codigo"]]
+                validas = validas[~repetidas]
+                
+                movimientos_creados = insertar_productos(db, validas)
+                db.commit()
+                codigos_existentes.update(validas["codigo"])
+                
+                totales["filas"] += resultado["filas"]
+                totales["productos"] += len(validas)
+                totales["movimientos"] += movimientos_creados
+                totales["errores"] += len(errores)
+                totales["lectura"] += resultado["segundos"]
+                print(
+                    f"   ✅ {nombre}: {resultado['filas']} filas, {len(validas)} productos nuevos, "
+                    f"{len(errores)} errores (lectura {resultado['segundos']:.2f}s)"
+                )
+                for error in errores[:MAX_ERRORES_EN_PANTALLA]:
+                    print(f"      ⚠️  {error}")
+                if len(errores) > MAX_ERRORES_EN_PANTALLA:
+                    print(f"      ... y {len(errores) - MAX_ERRORES_EN_PANTALLA} errores más")
+        
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error durante la importación: {e}")
+        print("   Los archivos ya confirmados quedaron guardados")
+        return False
+    finally:
+        db.close()
+    
+    transcurrido = time.perf_counter() - inicio
+    print(f"\n🎯 RESULTADOS DE LA IMPORTACIÓN")
+    print("=" * 50)
+    print(f"✅ Archivos importados: {len(archivos) - len(archivos_con_error)} de {len(archivos)}")
+    print(f"✅ Productos creados: {totales['productos']}")
+    print(f"✅ Movimientos de entrada: {totales['movimientos']}")
+    print(f"⚠️  Errores encontrados: {totales['errores']}")
+    for error in archivos_con_error:
+        print(f"❌ {error}")
+    print(
+        f"⏱️  {totales['filas']} filas en {transcurrido:.2f}s "
+        f"({totales['filas'] / transcurrido if transcurrido else 0:,.0f} filas/s; "
+        f"lectura sumada {totales['lectura']:.2f}s en {procesos} procesos)"
+    )
+    
+    return totales["productos"] > 0
+
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Importar inventario inicial desde Excel o CSV")
+    parser.add_argument("archivo", nargs="?",
+                        help="Archivo, carpeta o patrón (\"*.xlsx\") a importar; si no se indica, se elige de la carpeta actual")
+    parser.add_argument("--por-bloques", action="store_true",
+                        help="Leer de a bloques con commit y checkpoint por bloque (archivos grandes, XLSX o CSV)")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help=f"Filas por bloque (por defecto {TAMANO_BLOQUE})")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar el checkpoint y empezar desde la primera fila")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos de lectura para carpetas o patrones (por defecto, uno por CPU)")
+    args = parser.parse_args()
+    
     print("🏭 IMPORTADOR DE INVENTARIO INICIAL")
     print("=" * 60)
     
+    if args.archivo:
+        if os.path.isdir(args.archivo) or glob.has_magic(args.archivo):
+            exito = importar_varios_archivos(args.archivo, args.procesos)
+        elif args.por_bloques:
+            exito = importar_inventario_por_bloques(args.archivo, max(1, args.bloque), args.reiniciar)
+        else:
+            exito = importar_inventario_desde_excel(args.archivo)
+        mostrar_resultado_final(exito)
+        return
+    
     # Buscar archivo Excel en el directorio actual
     archivos_excel = [f for f in os.listdir('.') if f.endswith('.xlsx') or f.endswith('.xls')]
     
@@ -234,7 +675,10 @@ def main():
     
     # Importar inventario
     exito = importar_inventario_desde_excel(archivo_excel)
-    
+    mostrar_resultado_final(exito)
+
+def mostrar_resultado_final(exito):
+    """Mensaje final de la importación"""
     if exito:
         print(f"\n🎉 ¡IMPORTACIÓN COMPLETADA!")
         print("   Puedes ejecutar 'python ejecutar_produccion.py' para iniciar el sistema")
@@ -0,0 +1,321 @@
+"""
+API JSON versionada (/api/v1) para escáneres, el puente con el ERP y otros clientes
+
+Autenticación: POST /api/v1/token devuelve un token que se envía en el encabezado
+"Authorization: Bearer <token>" (el middleware de main.py también acepta la cookie
+del navegador). Los listados se paginan con cursores opacos (siguiente_cursor) y
+aceptan campos=a,b,c para devolver solo esas columnas.
+"""
+
+from datetime import date, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Producto, Movimiento, Usuario, RolUsuario
+from schemas import (
+    LoginRequest, Token, ProductoStock, SaldoStock, Movimiento as MovimientoSchema,
+    MovimientoKardex, MovimientoCreate, Pagina, ResultadoLote, SugerenciaProducto,
+    ProductoStockBajo
+)
+from busqueda import sugerencias_productos, LIMITE_SUGERENCIAS
+from stock import obtener_stock_productos, saldos_stock, pagina_kardex, registrar_movimientos_lote
+from paginacion import cursor_id, leer_cursor_id, cursor_movimiento, leer_cursor_movimiento, anteriores_a, orden_movimientos_desc
+from auth import authenticate_user_async, create_access_token, get_db, ACCESS_TOKEN_EXPIRE_MINUTES
+
+# orjson (opcional) serializa varias veces más rápido que json de la biblioteca estándar
+try:
+    from fastapi.responses import ORJSONResponse
+    import orjson  # noqa: F401
+except ImportError:
+    ORJSONResponse = None
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+# Líneas aceptadas por POST /api/v1/movimientos/lote
+MAX_LINEAS_LOTE = 5000
+TIPOS_MOVIMIENTO = ("entrada", "salida")
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+
+def respuesta_json(contenido, status_code: int = 200):
+    """Respuesta JSON con orjson si está instalado (las rutas no revalidan el contenido)"""
+    if ORJSONResponse is not None:
+        return ORJSONResponse(contenido, status_code=status_code)
+    return JSONResponse(jsonable_encoder(contenido), status_code=status_code)
+
+def seleccionar_campos(campos: Optional[str], esquema) -> list:
+    """Campos pedidos con campos=a,b,c (todos los del esquema si no se indica)"""
+    if not campos:
+        return list(esquema.model_fields)
+    pedidos = [campo.strip() for campo in campos.split(",") if campo.strip()]
+    desconocidos = [campo for campo in pedidos if campo not in esquema.model_fields]
+    if desconocidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(desconocidos)} (disponibles: {', '.join(esquema.model_fields)})"
+        )
+    return pedidos
+
+def pagina_json(items: list, campos: list, siguiente_cursor: Optional[str]):
+    """Página de resultados con solo los campos pedidos"""
+    return respuesta_json({
+        "items": [{campo: item[campo] for campo in campos} for item in items],
+        "siguiente_cursor": siguiente_cursor
+    })
+
+def leer_cursor(lector, cursor: Optional[str]):
+    """Decodificar un cursor de la query string (400 si es inválido)"""
+    if not cursor:
+        return None
+    try:
+        return lector(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def datos_movimiento(movimiento: Movimiento) -> dict:
+    """Campos de un movimiento para la API"""
+    return {
+        "id": movimiento.id,
+        "producto_id": movimiento.producto_id,
+        "tipo": movimiento.tipo,
+        "cantidad": movimiento.cantidad,
+        "descripcion": movimiento.descripcion,
+        "fecha": movimiento.fecha,
+        "fecha_creacion": movimiento.fecha_creacion
+    }
+
+def usuario_operador(request: Request) -> Usuario:
+    """Usuario autenticado por el middleware, con rol de operador o administrador"""
+    user = getattr(request.state, "current_user", None)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No autenticado")
+    if user.rol not in [RolUsuario.OPERADOR.value, RolUsuario.ADMIN.value]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requiere rol de operador o administrador para crear movimientos"
+        )
+    return user
+
+@router.post("/token", response_model=Token)
+async def obtener_token(datos: LoginRequest, db: Session = Depends(get_db)):
+    """Token de acceso para la API"""
+    user = await authenticate_user_async(db, datos.username, datos.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuario o contraseña incorrectos",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/productos", response_model=Pagina[ProductoStock])
+def api_productos(
+    cursor: Optional[str] = None,
+    limite: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    campos: Optional[str] = None,
+    incluir_inactivos: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Productos con su stock actual, ordenados por id"""
+    seleccion = seleccionar_campos(campos, ProductoStock)
+    filas = obtener_stock_productos(
+        db,
+        solo_activos=not incluir_inactivos,
+        despues_de=leer_cursor(leer_cursor_id, cursor),
+        limite=limite + 1
+    )
+    items = [
+        {
+            "id": producto.id,
+            "codigo": producto.codigo,
+            "nombre": producto.nombre,
+            "unidad_id": producto.unidad_id,
+            "grupo_id": producto.grupo_id,
+            "stock_minimo": producto.stock_minimo,
+            "fecha_creacion": producto.fecha_creacion,
+            "activo": producto.activo,
+            "stock_actual": stock_actual,
+            "stock_bajo": bool(stock_bajo)
+        }
+        for producto, stock_actual, stock_bajo in filas[:limite]
+    ]
+    siguiente = cursor_id(items[-1]["id"]) if len(filas) > limite else None
+    return pagina_json(items, seleccion, siguiente)
+
+@router.get("/productos/buscar", response_model=List[SugerenciaProducto])
+def api_buscar_productos(
+    q: str = "",
+    limite: int = Query(LIMITE_SUGERENCIAS, ge=1, le=50),
+    incluir_inactivos: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Autocompletar productos por código o nombre (cada palabra se busca como prefijo)"""
+    return respuesta_json(sugerencias_productos(db, q, limite=limite, solo_activos=not incluir_inactivos))
+
+@router.get("/stock", response_model=Pagina[SaldoStock])
+def api_stock(
+    cursor: Optional[str] = None,
+    limite: int = Query(LIMITE_MAXIMO, ge=1, le=LIMITE_MAXIMO),
+    campos: Optional[str] = None,
+    solo_stock_bajo: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Saldos de los productos activos (consulta liviana, pensada para consultas periódicas)"""
+    seleccion = seleccionar_campos(campos, SaldoStock)
+    filas = saldos_stock(
+        db,
+        solo_stock_bajo=solo_stock_bajo,
+        despues_de=leer_cursor(leer_cursor_id, cursor),
+        limite=limite + 1
+    )
+    items = [
+        {
+            "producto_id": fila.producto_id,
+            "codigo": fila.codigo,
+            "stock_actual": fila.stock_actual,
+            "stock_minimo": fila.stock_minimo,
+            "stock_bajo": bool(fila.stock_bajo)
+        }
+        for fila in filas[:limite]
+    ]
+    siguiente = cursor_id(items[-1]["producto_id"]) if len(filas) > limite else None
+    return pagina_json(items, seleccion, siguiente)
+
+@router.get("/stock/bajo", response_model=Pagina[ProductoStockBajo])
+def api_stock_bajo(
+    cursor: Optional[str] = None,
+    limite: int = Query(LIMITE_MAXIMO, ge=1, le=LIMITE_MAXIMO),
+    campos: Optional[str] = None,
+    incluir_inactivos: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Productos con stock bajo y cantidad faltante para llegar al mínimo, ordenados por id"""
+    seleccion = seleccionar_campos(campos, ProductoStockBajo)
+    filas = obtener_stock_productos(
+        db,
+        solo_activos=not incluir_inactivos,
+        solo_stock_bajo=True,
+        despues_de=leer_cursor(leer_cursor_id, cursor),
+        limite=limite + 1
+    )
+    items = [
+        {
+            "producto_id": producto.id,
+            "codigo": producto.codigo,
+            "nombre": producto.nombre,
+            "unidad": producto.unidad_rel.abreviatura if producto.unidad_rel else None,
+            "stock_actual": stock_actual,
+            "stock_minimo": producto.stock_minimo or 0.0,
+            "faltante": (producto.stock_minimo or 0.0) - stock_actual
+        }
+        for producto, stock_actual, _ in filas[:limite]
+    ]
+    siguiente = cursor_id(items[-1]["producto_id"]) if len(filas) > limite else None
+    return pagina_json(items, seleccion, siguiente)
+
+@router.get("/movimientos", response_model=Pagina[MovimientoSchema])
+def api_movimientos(
+    producto_id: Optional[int] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    campos: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Movimientos del más reciente al más antiguo"""
+    seleccion = seleccionar_campos(campos, MovimientoSchema)
+    query = db.query(Movimiento)
+    if producto_id:
+        query = query.filter(Movimiento.producto_id == producto_id)
+    if fecha_inicio:
+        query = query.filter(Movimiento.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Movimiento.fecha <= fecha_fin)
+    clave = leer_cursor(leer_cursor_movimiento, cursor)
+    if clave:
+        query = query.filter(anteriores_a(clave))
+
+    movimientos = query.order_by(*orden_movimientos_desc()).limit(limite + 1).all()
+    siguiente = cursor_movimiento(movimientos[limite - 1]) if len(movimientos) > limite else None
+    return pagina_json([datos_movimiento(m) for m in movimientos[:limite]], seleccion, siguiente)
+
+@router.get("/kardex/{producto_id}", response_model=Pagina[MovimientoKardex])
+def api_kardex(
+    producto_id: int,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    campos: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Kardex de un producto con saldo progresivo, del movimiento más reciente al más antiguo"""
+    seleccion = seleccionar_campos(campos, MovimientoKardex)
+    if db.get(Producto, producto_id) is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    filas, hay_mas = pagina_kardex(
+        db, producto_id,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        anterior_a=leer_cursor(leer_cursor_movimiento, cursor),
+        limite=limite
+    )
+    items = [{**datos_movimiento(fila["movimiento"]), "saldo": fila["saldo"]} for fila in filas]
+    siguiente = cursor_movimiento(filas[-1]["movimiento"]) if hay_mas else None
+    return pagina_json(items, seleccion, siguiente)
+
+@router.post("/movimientos/lote", response_model=ResultadoLote)
+def api_movimientos_lote(
+    lineas: List[MovimientoCreate],
+    todo_o_nada: bool = False,
+    usuario: Usuario = Depends(usuario_operador),
+    db: Session = Depends(get_db)
+):
+    """Registrar muchos movimientos (por ejemplo, una entrega completa) en una sola transacción
+
+    Las líneas inválidas se informan en resultados y el resto se registra; con
+    todo_o_nada=true, una sola línea inválida rechaza el lote completo (422).
+    """
+    if not lineas:
+        raise HTTPException(status_code=400, detail="El lote no tiene líneas")
+    if len(lineas) > MAX_LINEAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"El lote supera el máximo de {MAX_LINEAS_LOTE} líneas")
+
+    # Todos los productos del lote se validan con una sola consulta
+    producto_ids = {linea.producto_id for linea in lineas}
+    existentes = set(db.execute(select(Producto.id).where(Producto.id.in_(producto_ids))).scalars())
+
+    resultados = []
+    validas = []
+    for numero, linea in enumerate(lineas, start=1):
+        if linea.producto_id not in existentes:
+            error = "Producto no encontrado"
+        elif linea.tipo not in TIPOS_MOVIMIENTO:
+            error = f"Tipo inválido: {linea.tipo} (entrada o salida)"
+        elif linea.cantidad <= 0:
+            error = "La cantidad debe ser mayor que cero"
+        else:
+            error = None
+            validas.append((numero - 1, linea))
+        resultados.append({"linea": numero, "ok": error is None, "id": None, "error": error})
+
+    rechazados = len(lineas) - len(validas)
+    if rechazados and todo_o_nada:
+        return respuesta_json({"insertados": 0, "rechazados": rechazados, "resultados": resultados}, status_code=422)
+
+    ids = registrar_movimientos_lote(db, [linea.model_dump() for _, linea in validas])
+    db.commit()
+    for (indice, _), movimiento_id in zip(validas, ids):
+        resultados[indice]["id"] = movimiento_id
+
+    return respuesta_json({"insertados": len(ids), "rechazados": rechazados, "resultados": resultados})
@@ -1,9 +1,16 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Usuario, RolUsuario
@@ -17,11 +24,36 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Configuración de hash de contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Pool acotado para bcrypt: bcrypt libera el GIL, así que unos pocos hilos bastan y
+# una ráfaga de logins no ocupa los hilos que atienden el resto de las rutas
+HASH_WORKERS = int(os.getenv("INVENTARIO_HASH_WORKERS", 2))
+MAX_VERIFICACIONES_POR_USUARIO = int(os.getenv("INVENTARIO_MAX_VERIFICACIONES_POR_USUARIO", 2))
+
+_pool_hash = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_verificaciones_en_curso = {}  # username -> verificaciones en curso (solo se usa desde el event loop)
+
 # Configuración de autenticación
 security = HTTPBearer()
 
-def get_db():
-    """Dependencia para obtener la sesión de base de datos"""
+# Último acceso: se acumula en memoria y una tarea de fondo lo guarda en un solo UPDATE,
+# en lugar de un commit (y un fsync) por request autenticada
+INTERVALO_GUARDADO_ACCESOS = int(os.getenv("INVENTARIO_INTERVALO_GUARDADO_ACCESOS", 30))  # Segundos
+INTERVALO_MINIMO_ACCESO = int(os.getenv("INVENTARIO_INTERVALO_MINIMO_ACCESO", 60))  # Segundos por usuario
+
+_accesos_pendientes = {}  # usuario_id -> último acceso aún no guardado
+_ultimo_acceso_registrado = {}  # usuario_id -> último acceso aceptado en el buffer
+_lock_accesos = threading.Lock()
+
+def get_db(request: Request):
+    """Dependencia para obtener la sesión de base de datos
+
+    Reutiliza la sesión de la request creada por el middleware de autenticación
+    (que también la cierra); en rutas públicas abre una sesión propia.
+    """
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        yield db
+        return
     db = SessionLocal()
     try:
         yield db
@@ -36,6 +68,35 @@ def get_password_hash(password: str) -> str:
     """Generar hash de contraseña"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verificar contraseña en el pool de hash sin bloquear el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_hash, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generar hash de contraseña en el pool de hash sin bloquear el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_hash, get_password_hash, password)
+
+@asynccontextmanager
+async def limite_por_usuario(username: str):
+    """Limitar las verificaciones de contraseña simultáneas de un mismo usuario"""
+    en_curso = _verificaciones_en_curso.get(username, 0)
+    if en_curso >= MAX_VERIFICACIONES_POR_USUARIO:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos simultáneos para este usuario"
+        )
+    _verificaciones_en_curso[username] = en_curso + 1
+    try:
+        yield
+    finally:
+        restantes = _verificaciones_en_curso[username] - 1
+        if restantes:
+            _verificaciones_en_curso[username] = restantes
+        else:
+            del _verificaciones_en_curso[username]
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token de acceso JWT"""
     to_encode = data.copy()
@@ -82,6 +143,18 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Usu
         return None
     return user
 
+async def authenticate_user_async(db: Session, username: str, password: str) -> Optional[Usuario]:
+    """Autenticar usuario sin bloquear el event loop (consulta en hilo, bcrypt en el pool)"""
+    user = await run_in_threadpool(db.query(Usuario).filter(Usuario.username == username).first)
+    if not user:
+        return None
+    async with limite_por_usuario(username):
+        if not await verify_password_async(password, user.hashed_password):
+            return None
+    if not user.activo:
+        return None
+    return user
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -96,9 +169,8 @@ def get_current_user(
     if user is None:
         raise credentials_exception
     
-    # Actualizar último acceso
-    user.ultimo_acceso = datetime.now()
-    db.commit()
+    # Registrar último acceso (se guarda en lote)
+    registrar_acceso(user.id)
     
     return user
 
@@ -152,3 +224,46 @@ def can_access_module(current_user: Usuario, module: str) -> bool:
     }
     
     return current_user.rol in permissions.get(module, [])
+
+def registrar_acceso(usuario_id: int, momento: Optional[datetime] = None):
+    """Anotar el último acceso de un usuario en el buffer (como mucho uno por intervalo mínimo)"""
+    momento = momento or datetime.now()
+    with _lock_accesos:
+        anterior = _ultimo_acceso_registrado.get(usuario_id)
+        if anterior and (momento - anterior).total_seconds() < INTERVALO_MINIMO_ACCESO:
+            return
+        _ultimo_acceso_registrado[usuario_id] = momento
+        _accesos_pendientes[usuario_id] = momento
+
+def guardar_accesos_pendientes() -> int:
+    """Guardar los accesos del buffer en un solo UPDATE por lotes"""
+    with _lock_accesos:
+        pendientes = dict(_accesos_pendientes)
+        _accesos_pendientes.clear()
+    if not pendientes:
+        return 0
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Usuario),
+            [{"id": usuario_id, "ultimo_acceso": momento} for usuario_id, momento in pendientes.items()]
+        )
+        db.commit()
+    except Exception as e:
+        print(f"Error al guardar últimos accesos: {e}")
+        db.rollback()
+        # Devolver al buffer lo que no se pudo guardar, sin pisar accesos más nuevos
+        with _lock_accesos:
+            for usuario_id, momento in pendientes.items():
+                _accesos_pendientes.setdefault(usuario_id, momento)
+        return 0
+    finally:
+        db.close()
+    return len(pendientes)
+
+async def tarea_guardar_accesos():
+    """Tarea de fondo: guardar los últimos accesos cada INTERVALO_GUARDADO_ACCESOS segundos"""
+    while True:
+        await asyncio.sleep(INTERVALO_GUARDADO_ACCESOS)
+        await run_in_threadpool(guardar_accesos_pendientes)
@@ -0,0 +1,150 @@
+"""
+Búsqueda de productos por código y nombre
+
+Usa un índice FTS5 de SQLite (productos_fts) sincronizado con triggers, así que buscar
+entre miles de productos no recorre la tabla. Cada palabra escrita se busca como prefijo
+de una palabra del código o del nombre, sin distinguir mayúsculas ni tildes ("fil 320"
+encuentra "Filtro de Aceite Motor 320"). Si el SQLite instalado no incluye FTS5, el
+respaldo aplica las mismas reglas recorriendo la tabla: encuentra los mismos productos,
+más lento, y los ordena por código en lugar de por relevancia (bm25).
+"""
+
+import heapq
+import re
+import unicodedata
+from typing import List, Optional
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from models import Producto, StockProducto, Unidad
+
+LIMITE_SUGERENCIAS = 10
+LIMITE_RESULTADOS = 200
+
+# Tabla FTS5 de contenido externo: guarda solo el índice, el texto se lee de productos
+SQL_INDICE_BUSQUEDA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5("
+    "codigo, nombre, content='productos', content_rowid='id', "
+    "tokenize='unicode61', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN "
+    "INSERT INTO productos_fts (rowid, codigo, nombre) VALUES (new.id, new.codigo, new.nombre); END",
+    "CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN "
+    "INSERT INTO productos_fts (productos_fts, rowid, codigo, nombre) "
+    "VALUES ('delete', old.id, old.codigo, old.nombre); END",
+    "CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF codigo, nombre ON productos BEGIN "
+    "INSERT INTO productos_fts (productos_fts, rowid, codigo, nombre) "
+    "VALUES ('delete', old.id, old.codigo, old.nombre); "
+    "INSERT INTO productos_fts (rowid, codigo, nombre) VALUES (new.id, new.codigo, new.nombre); END",
+]
+
+# None: todavía no se verificó si existe el índice en esta base de datos
+_indice_disponible: Optional[bool] = None
+
+def crear_indice_busqueda(conexion) -> bool:
+    """Crear el índice FTS5 y sus triggers y poblarlo (False si SQLite no tiene FTS5)"""
+    try:
+        # Savepoint: si falla, la migración sigue en la misma transacción sin el índice
+        with conexion.begin_nested():
+            for sentencia in SQL_INDICE_BUSQUEDA:
+                conexion.execute(text(sentencia))
+            conexion.execute(text("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"⚠️  SQLite sin FTS5, la búsqueda de productos recorrerá la tabla: {e}")
+        return False
+    return True
+
+def reconstruir_indice_busqueda(db: Session) -> bool:
+    """Volver a indexar todos los productos (False si no hay índice FTS5)"""
+    if not indice_disponible(db):
+        return False
+    db.execute(text("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')"))
+    return True
+
+def indice_disponible(db: Session) -> bool:
+    """¿Existe la tabla productos_fts? (se consulta una vez por proceso)"""
+    global _indice_disponible
+    if _indice_disponible is None:
+        _indice_disponible = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'")
+        ).first() is not None
+    return _indice_disponible
+
+def sin_tildes(texto: str) -> str:
+    """Texto en minúsculas y sin tildes (como lo indexa el tokenizador unicode61)"""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+def palabras_busqueda(texto: str) -> List[str]:
+    """Palabras del texto, en minúsculas y sin tildes (los guiones, barras y espacios separan)"""
+    return re.findall(r"\w+", sin_tildes(texto or ""))
+
+def _ids_fts(db: Session, palabras: List[str], exacto: str, limite: int, solo_activos: bool) -> List[int]:
+    """Ids por relevancia con el índice FTS5 (el código pesa más que el nombre)"""
+    consulta = " ".join(f'"{palabra}"*' for palabra in palabras)
+    sql = (
+        "SELECT p.id FROM productos_fts JOIN productos p ON p.id = productos_fts.rowid "
+        "WHERE productos_fts MATCH :consulta"
+        + (" AND p.activo = 1" if solo_activos else "")
+        + " ORDER BY (upper(p.codigo) = :exacto) DESC, bm25(productos_fts, 10.0, 1.0), p.id LIMIT :limite"
+    )
+    return list(db.execute(text(sql), {"consulta": consulta, "exacto": exacto, "limite": limite}).scalars())
+
+def _ids_sin_indice(db: Session, palabras: List[str], exacto: str, limite: int, solo_activos: bool) -> List[int]:
+    """Ids con las mismas reglas que el índice, recorriendo la tabla (respaldo sin FTS5)"""
+    consulta = select(Producto.id, Producto.codigo, Producto.nombre)
+    if solo_activos:
+        consulta = consulta.where(Producto.activo == True)
+
+    coincidencias = []
+    for producto_id, codigo, nombre in db.execute(consulta.execution_options(yield_per=1000)):
+        palabras_producto = palabras_busqueda(f"{codigo} {nombre}")
+        if all(any(palabra.startswith(buscada) for palabra in palabras_producto) for buscada in palabras):
+            coincidencias.append((codigo.upper() != exacto, codigo, producto_id))
+    return [producto_id for _, _, producto_id in heapq.nsmallest(limite, coincidencias)]
+
+def buscar_ids_productos(
+    db: Session,
+    texto: str,
+    limite: int = LIMITE_RESULTADOS,
+    solo_activos: bool = True
+) -> List[int]:
+    """Ids de los productos cuyo código o nombre coincide, del más al menos relevante
+
+    Un código escrito completo aparece primero.
+    """
+    palabras = palabras_busqueda(texto)
+    if not palabras:
+        return []
+    exacto = texto.strip().upper()
+    if indice_disponible(db):
+        return _ids_fts(db, palabras, exacto, limite, solo_activos)
+    return _ids_sin_indice(db, palabras, exacto, limite, solo_activos)
+
+def sugerencias_productos(db: Session, texto: str, limite: int = LIMITE_SUGERENCIAS, solo_activos: bool = True) -> list:
+    """Sugerencias para autocompletar: pocos campos y en orden de relevancia"""
+    ids = buscar_ids_productos(db, texto, limite=limite, solo_activos=solo_activos)
+    if not ids:
+        return []
+    filas = db.execute(
+        select(
+            Producto.id,
+            Producto.codigo,
+            Producto.nombre,
+            Unidad.abreviatura.label("unidad"),
+            func.coalesce(StockProducto.cantidad, 0.0).label("stock_actual")
+        )
+        .outerjoin(StockProducto, StockProducto.producto_id == Producto.id)
+        .outerjoin(Unidad, Unidad.id == Producto.unidad_id)
+        .where(Producto.id.in_(ids))
+    ).all()
+    por_id = {fila.id: fila for fila in filas}
+    return [
+        {
+            "id": fila.id,
+            "codigo": fila.codigo,
+            "nombre": fila.nombre,
+            "unidad": fila.unidad,
+            "stock_actual": fila.stock_actual
+        }
+        for fila in (por_id[producto_id] for producto_id in ids if producto_id in por_id)
+    ]
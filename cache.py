@@ -0,0 +1,136 @@
+import hashlib
+from datetime import datetime, date, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from threading import Lock
+from typing import Callable, Optional, Sequence, Tuple
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from models import VersionDatos, Unidad, Grupo
+
+def incrementar_version(db: Session, *tablas: str):
+    """Marcar tablas como modificadas, en la misma transacción que el cambio (sin hacer commit)"""
+    ahora = datetime.now()
+    for tabla in tablas:
+        resultado = db.execute(
+            update(VersionDatos)
+            .where(VersionDatos.tabla == tabla)
+            .values(version=VersionDatos.version + 1, actualizado=ahora)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount == 0:
+            db.execute(insert(VersionDatos).values(tabla=tabla, version=1, actualizado=ahora))
+
+def obtener_versiones(db: Session, tablas: Sequence[str]) -> tuple:
+    """Versión actual de cada tabla (0 si nunca se modificó)"""
+    versiones = dict(
+        db.execute(
+            select(VersionDatos.tabla, VersionDatos.version).where(VersionDatos.tabla.in_(tablas))
+        ).all()
+    )
+    return tuple(versiones.get(tabla, 0) for tabla in tablas)
+
+def estado_tablas(db: Session, tablas: Sequence[str]) -> Tuple[tuple, Optional[datetime]]:
+    """Versiones de las tablas y fecha de su último cambio, en una sola consulta"""
+    filas = {
+        tabla: (version, actualizado)
+        for tabla, version, actualizado in db.execute(
+            select(VersionDatos.tabla, VersionDatos.version, VersionDatos.actualizado)
+            .where(VersionDatos.tabla.in_(tablas))
+        ).all()
+    }
+    versiones = tuple(filas.get(tabla, (0, None))[0] for tabla in tablas)
+    fechas = [actualizado for _, actualizado in filas.values() if actualizado]
+    return versiones, max(fechas) if fechas else None
+
+class CacheVersionado:
+    """Caché en memoria cuyas entradas se invalidan cuando cambia la versión de sus tablas
+
+    Las versiones se leen de la base de datos en cada consulta (una búsqueda por clave
+    primaria), así que un cambio hecho en cualquier worker invalida la caché de todos.
+    Los valores guardados deben ser datos simples, no objetos ORM ligados a una sesión.
+    """
+
+    def __init__(self):
+        self._entradas = {}
+        self._lock = Lock()
+
+    def obtener(self, db: Session, clave: str, tablas: Sequence[str], calcular: Callable):
+        """Valor en caché para la clave, recalculado con calcular(db) si cambiaron las tablas"""
+        version = obtener_versiones(db, tablas)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+        if entrada and entrada[0] == version:
+            return entrada[1]
+
+        valor = calcular(db)
+        with self._lock:
+            self._entradas[clave] = (version, valor)
+        return valor
+
+    def limpiar(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entradas.clear()
+
+cache = CacheVersionado()
+
+def _cargar_datos_referencia(db: Session) -> dict:
+    """Unidades y grupos activos, ordenados por nombre"""
+    unidades = db.query(Unidad).filter(Unidad.activo == True).order_by(Unidad.nombre.asc()).all()
+    grupos = db.query(Grupo).filter(Grupo.activo == True).order_by(Grupo.nombre.asc()).all()
+    return {
+        "unidades": [{"id": u.id, "nombre": u.nombre, "abreviatura": u.abreviatura} for u in unidades],
+        "grupos": [{"id": g.id, "nombre": g.nombre} for g in grupos],
+    }
+
+def datos_referencia(db: Session) -> dict:
+    """Unidades y grupos activos para los formularios, desde la caché"""
+    return cache.obtener(db, "referencia", ("unidades", "grupos"), _cargar_datos_referencia)
+
+# ===== VALIDADORES HTTP (ETag / Last-Modified) =====
+
+class ValidadorPagina:
+    """ETag y Last-Modified de una página, calculados antes de consultar y renderizar
+
+    El ETag combina las versiones de las tablas de las que depende la página, la URL con
+    sus parámetros, el usuario y su rol (el menú cambia según el rol) y la fecha de hoy
+    (hay filtros por defecto relativos a hoy). Es débil (W/) porque el mismo contenido
+    puede enviarse comprimido o no.
+    """
+
+    def __init__(self, db: Session, tablas: Sequence[str], url: str, usuario_id: int, rol: str):
+        versiones, actualizado = estado_tablas(db, tablas)
+        hoy = date.today()
+        clave = f"{tablas}|{versiones}|{url}|{usuario_id}|{rol}|{hoy}"
+        self.etag = f'W/"{hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20]}"'
+        
+        # Sin cambios registrados hoy, la página igual puede cambiar al cambiar el día
+        inicio_de_hoy = datetime.combine(hoy, time.min)
+        self.ultima_modificacion = max(actualizado or inicio_de_hoy, inicio_de_hoy).replace(microsecond=0)
+
+    def cabeceras(self) -> dict:
+        """Cabeceras de validación para la respuesta (el navegador debe revalidar siempre)"""
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.ultima_modificacion.astimezone(timezone.utc), usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+
+    def no_modificada(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """¿La copia del navegador sigue vigente? If-None-Match tiene prioridad"""
+        if if_none_match:
+            etiquetas = [etiqueta.strip() for etiqueta in if_none_match.split(",")]
+            return "*" in etiquetas or any(_sin_prefijo_debil(e) == _sin_prefijo_debil(self.etag) for e in etiquetas)
+        if if_modified_since:
+            try:
+                fecha = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if fecha.tzinfo is None:
+                return False
+            return self.ultima_modificacion.astimezone(timezone.utc) <= fecha
+        return False
+
+def _sin_prefijo_debil(etiqueta: str) -> str:
+    """Quitar el prefijo W/ (comparación débil de ETags)"""
+    return etiqueta[2:] if etiqueta.startswith("W/") else etiqueta
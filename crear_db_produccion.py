@@ -15,10 +15,15 @@ def limpiar_base_datos():
     print("🧹 CREANDO BASE DE DATOS LIMPIA PARA PRODUCCIÓN")
     print("=" * 60)
     
-    # Eliminar base de datos existente
-    if os.path.exists("inventario.db"):
-        print("⚠️  Eliminando base de datos anterior...")
-        os.remove("inventario.db")
+    # Eliminar base de datos existente junto con sus archivos de WAL: si quedaran de una
+    # detención abrupta, SQLite intentaría aplicarlos sobre la base nueva
+    archivo_bd = engine.url.database
+    if archivo_bd and archivo_bd != ":memory:":
+        if os.path.exists(archivo_bd):
+            print("⚠️  Eliminando base de datos anterior...")
+        for sufijo in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(archivo_bd + sufijo):
+                os.remove(archivo_bd + sufijo)
     
     # Crear todas las tablas
     print("🏗️  Creando estructura de tablas...")
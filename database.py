@@ -1,15 +1,67 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Configuración de la base de datos SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./inventario.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("INVENTARIO_DATABASE_URL", "sqlite:///./inventario.db")
+
+# Perfil del motor SQLite (variable INVENTARIO_PERFIL_SQLITE):
+#   "rendimiento": WAL (los lectores no bloquean al escritor), synchronous=NORMAL,
+#                  mmap, caché ampliada y espera ante bloqueos en lugar de fallar
+#   "basico":      configuración por defecto de SQLite (rollback journal)
+PERFIL_SQLITE = os.getenv("INVENTARIO_PERFIL_SQLITE", "rendimiento")
+
+PERFILES_SQLITE = {
+    "basico": {},
+    "rendimiento": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.getenv("INVENTARIO_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": int(os.getenv("INVENTARIO_SQLITE_CACHE_SIZE", -64000)),  # Negativo = KiB
+        "busy_timeout": int(os.getenv("INVENTARIO_SQLITE_BUSY_TIMEOUT", 10000)),  # Milisegundos
+        "temp_store": "MEMORY",
+    },
+}
+
+if PERFIL_SQLITE not in PERFILES_SQLITE:
+    raise ValueError(f"Perfil SQLite desconocido: {PERFIL_SQLITE} (opciones: {', '.join(PERFILES_SQLITE)})")
+
+PRAGMAS_SQLITE = PERFILES_SQLITE[PERFIL_SQLITE]
+
+connect_args = {"check_same_thread": False}
+if "busy_timeout" in PRAGMAS_SQLITE:
+    # Espera del driver ante una base bloqueada, alineada con busy_timeout
+    connect_args["timeout"] = PRAGMAS_SQLITE["busy_timeout"] / 1000
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=connect_args
 )
 
+@event.listens_for(engine, "connect")
+def aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+    """Aplicar los PRAGMA del perfil a cada conexión nueva"""
+    if not PRAGMAS_SQLITE:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for nombre, valor in PRAGMAS_SQLITE.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+    finally:
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+def bloquear_escritura(db):
+    """Abrir la transacción con BEGIN IMMEDIATE: toma el bloqueo de escritura antes de leer
+
+    pysqlite no abre transacción para los SELECT, así que otro proceso puede escribir
+    entre lo leído y lo que se inserta después. Si la sesión ya escribió, ya tiene el
+    bloqueo y no se hace nada.
+    """
+    conexion = db.connection().connection.dbapi_connection
+    if not conexion.in_transaction:
+        conexion.execute("BEGIN IMMEDIATE")
@@ -2,33 +2,131 @@
 """
 Script para ejecutar el sistema de inventario en producción (red local)
 Configurado para almacén satelital
+
+Uso: python ejecutar_produccion.py [--workers N] [--puerto 8000]
+
+Con varios workers (procesos) cada terminal de la red es atendida en paralelo.
+SQLite admite varios lectores y un escritor a la vez solo en modo WAL, por lo que
+este script activa WAL antes de iniciar y usa un solo worker si no es posible.
 """
 
+import argparse
 import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
 import uvicorn
 from datetime import datetime
-import shutil
+from urllib.parse import quote
+
+from database import engine
+
+# Archivo de la base configurada (INVENTARIO_DATABASE_URL, por defecto ./inventario.db)
+ARCHIVO_BD = engine.url.database or ""
+
+def es_archivo_bd():
+    """¿La base de datos es un archivo? (no lo es una base SQLite en memoria)"""
+    return bool(ARCHIVO_BD) and ARCHIVO_BD != ":memory:"
 
 def crear_backup_bd():
     """Crear backup automático de la base de datos"""
-    if os.path.exists("inventario.db"):
+    if es_archivo_bd() and os.path.exists(ARCHIVO_BD):
         backup_dir = "backups"
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
-        
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_file = f"{backup_dir}/inventario_backup_{timestamp}.db"
-        
+
         try:
-            shutil.copy2("inventario.db", backup_file)
+            # API de backup de SQLite: incluye lo pendiente en el archivo -wal,
+            # que una copia directa del archivo perdería
+            origen = sqlite3.connect(ARCHIVO_BD)
+            destino = sqlite3.connect(backup_file)
+            try:
+                origen.backup(destino)
+            finally:
+                destino.close()
+                origen.close()
             print(f"✅ Backup creado: {backup_file}")
         except Exception as e:
             print(f"⚠️  Error al crear backup: {e}")
 
-def mostrar_info_red():
+def activar_wal():
+    """Activar el modo WAL (persistente en el archivo) y verificar que quedó activo"""
+    if not es_archivo_bd():
+        print("⚠️  La base de datos no es un archivo: no se puede usar el modo WAL")
+        return False
+    try:
+        # mode=rw: si el archivo no existe falla en lugar de crear una base vacía
+        uri = f"file:{quote(os.path.abspath(ARCHIVO_BD))}?mode=rw"
+        conexion = sqlite3.connect(uri, uri=True)
+        try:
+            modo = conexion.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        finally:
+            conexion.close()
+    except Exception as e:
+        print(f"⚠️  No se pudo activar el modo WAL: {e}")
+        return False
+
+    if modo.lower() != "wal":
+        # Por ejemplo, si la base de datos está en una carpeta compartida de red
+        print(f"⚠️  SQLite no aceptó el modo WAL (modo actual: {modo})")
+        return False
+    return True
+
+def tareas_fondo_inicio(con_backup):
+    """Backup y cierres de período: se ejecutan mientras el servidor ya atiende"""
+    from database import SessionLocal
+    from stock import generar_cierres
+
+    inicio = time.perf_counter()
+    if con_backup:
+        crear_backup_bd()
+    with SessionLocal() as db:
+        total = generar_cierres(db)
+    print(f"⏱️  Tareas de fondo terminadas en {time.perf_counter() - inicio:.2f}s ({total} cierres nuevos)")
+
+def preparar_inicio(workers, en_fondo=True):
+    """Tareas de inicio que deben ejecutarse una sola vez, no una vez por worker"""
+    from database import PERFIL_SQLITE
+    from migraciones import esquema_actualizado, preparar_base_datos
+
+    inicio = time.perf_counter()
+    existia_bd = es_archivo_bd() and os.path.exists(ARCHIVO_BD)
+
+    # Verificación rápida del esquema; si hay migraciones pendientes el backup va antes
+    backup_en_fondo = True
+    if not existia_bd or not esquema_actualizado(engine):
+        crear_backup_bd()
+        backup_en_fondo = False
+        preparar_base_datos(engine)
+    print(f"⏱️  Esquema verificado en {time.perf_counter() - inicio:.2f}s")
+
+    if en_fondo:
+        threading.Thread(target=tareas_fondo_inicio, args=(backup_en_fondo,), name="inicio").start()
+    else:
+        tareas_fondo_inicio(backup_en_fondo)
+
+    # Varios escritores concurrentes requieren WAL y el perfil que lo configura
+    if workers > 1:
+        if PERFIL_SQLITE != "rendimiento":
+            print(f"⚠️  El perfil SQLite '{PERFIL_SQLITE}' no usa WAL: se iniciará un solo worker")
+            workers = 1
+        elif not activar_wal():
+            print("⚠️  Sin modo WAL no es seguro usar varios workers: se iniciará un solo worker")
+            workers = 1
+
+    # Los workers no repiten la preparación de la base de datos (ver main.py)
+    os.environ["INVENTARIO_BD_PREPARADA"] = "1"
+    return workers
+
+def mostrar_info_red(puerto, workers):
     """Mostrar información de acceso en red"""
     import socket
-    
+
     # Obtener IP local
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -37,51 +135,84 @@ def mostrar_info_red():
         s.close()
     except:
         ip_local = "localhost"
-    
+
     print("\n" + "="*60)
     print("🏭 SISTEMA DE INVENTARIO - ALMACÉN SATELITAL")
     print("="*60)
-    print(f"📡 Servidor iniciado en: http://{ip_local}:8000")
-    print(f"🌐 Acceso local: http://localhost:8000")
-    print(f"📱 Desde otros equipos en la red: http://{ip_local}:8000")
+    print(f"📡 Servidor iniciado en: http://{ip_local}:{puerto}")
+    print(f"🌐 Acceso local: http://localhost:{puerto}")
+    print(f"📱 Desde otros equipos en la red: http://{ip_local}:{puerto}")
+    print(f"⚙️  Workers: {workers}")
     print("\n💡 INSTRUCCIONES:")
-    print("   • Desde la misma computadora: usa localhost:8000")
+    print(f"   • Desde la misma computadora: usa localhost:{puerto}")
     print("   • Desde otras computadoras en la red: usa la IP mostrada")
-    print("   • Para detener: presiona Ctrl+C")
+    print("   • Para detener: presiona Ctrl+C (las requests en curso terminan antes de salir)")
     print("\n📋 GESTIÓN DE DATOS:")
-    print("   • Base de datos: inventario.db")
+    print(f"   • Base de datos: {ARCHIVO_BD} (+ {ARCHIVO_BD}-wal / -shm en modo WAL)")
     print("   • Backups automáticos en: ./backups/")
-    print("   • Para backup manual: copia inventario.db")
+    print(f"   • Para backup manual: detén el sistema y copia {ARCHIVO_BD}")
     print("="*60 + "\n")
 
+def ejecutar_gunicorn(config):
+    """Ejecutar con gunicorn (Linux): permite reinicios graduales con kill -HUP <pid>"""
+    argumentos = [
+        "gunicorn", config["app"],
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(config["workers"]),
+        "--bind", f"{config['host']}:{config['port']}",
+        "--graceful-timeout", str(config["timeout_graceful_shutdown"]),
+        "--access-logfile", "-",
+    ]
+    os.execvp("gunicorn", argumentos)
+
 def main():
+    parser = argparse.ArgumentParser(description="Sistema de inventario en producción (red local)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INVENTARIO_WORKERS", 4)),
+                        help="Procesos que atienden requests (por defecto 4 o INVENTARIO_WORKERS)")
+    parser.add_argument("--puerto", type=int, default=int(os.getenv("INVENTARIO_PUERTO", 8000)))
+    parser.add_argument("--gunicorn", action="store_true",
+                        help="Usar gunicorn (solo Linux) para reinicios graduales con kill -HUP")
+    args = parser.parse_args()
+
+    # gunicorn es opcional (no está en requirements.txt): avisar antes de preparar nada
+    if args.gunicorn and shutil.which("gunicorn") is None:
+        print("❌ --gunicorn requiere gunicorn instalado: pip install gunicorn")
+        print("   Sin --gunicorn el sistema inicia con uvicorn")
+        sys.exit(1)
+
     print("🚀 Iniciando Sistema de Inventario para Almacén Satelital...")
-    
-    # Crear backup al iniciar
-    crear_backup_bd()
-    
+
+    # Esquema y modo WAL una sola vez antes de iniciar los workers; backup y cierres en
+    # segundo plano (gunicorn reemplaza este proceso, así que en ese caso se esperan)
+    workers = preparar_inicio(max(1, args.workers), en_fondo=not args.gunicorn)
+
     # Mostrar información de red
-    mostrar_info_red()
-    
+    mostrar_info_red(args.puerto, workers)
+
     # Configuración para red local
     config = {
         "app": "main:app",
         "host": "0.0.0.0",  # Permite acceso desde toda la red local
-        "port": 8000,
+        "port": args.puerto,
         "reload": False,    # Estabilidad en producción
-        "workers": 1,       # Suficiente para 1-2 usuarios
+        "workers": workers,
+        "timeout_graceful_shutdown": 30,  # Segundos para terminar las requests en curso al detener
         "access_log": True,
         "log_level": "info"
     }
-    
+
+    if args.gunicorn:
+        ejecutar_gunicorn(config)
+
     try:
         uvicorn.run(**config)
     except KeyboardInterrupt:
         print("\n\n🛑 Servidor detenido por el usuario")
-        print("📁 Base de datos guardada en: inventario.db")
+        print(f"📁 Base de datos guardada en: {ARCHIVO_BD}")
         print("💾 Backups disponibles en: ./backups/")
     except Exception as e:
         print(f"\n❌ Error al iniciar servidor: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,200 @@
+"""
+Archivos estáticos con huella de contenido y variantes precomprimidas
+
+Las plantillas piden las URLs con estatico("style.css"), que devuelve
+/static/style.<huella>.css: la huella cambia cuando cambia el archivo, así que esas URLs
+se cachean un año sin revalidar. Los archivos de texto se sirven desde su variante .br
+(si brotli está instalado) o .gz, generadas una sola vez al iniciar. Las páginas HTML,
+JSON y CSV se comprimen al enviarlas con CompresionRespuestas.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import zlib
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Message, Receive, Scope, Send
+
+# brotli (opcional) comprime el CSS alrededor de un 15 % más que gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LARGO_HUELLA = 12
+EXTENSIONES_COMPRIMIBLES = {".css", ".js", ".svg", ".ico", ".json", ".txt", ".html"}
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+# nombre.<huella>.ext
+PATRON_HUELLA = re.compile(rf"^(?P<base>.+)\.(?P<huella>[0-9a-f]{{{LARGO_HUELLA}}})(?P<ext>\.[^./]+)$")
+
+def huella_archivo(ruta: str) -> str:
+    """Primeros caracteres del SHA-256 del contenido"""
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(64 * 1024), b""):
+            resumen.update(bloque)
+    return resumen.hexdigest()[:LARGO_HUELLA]
+
+def escribir_variante(ruta: str, sufijo: str, comprimir) -> Optional[str]:
+    """Escribir ruta+sufijo si falta o es más vieja que el original (None si no conviene)"""
+    destino = ruta + sufijo
+    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(ruta):
+        return destino
+
+    with open(ruta, "rb") as archivo:
+        original = archivo.read()
+    comprimido = comprimir(original)
+    if len(comprimido) >= len(original):
+        return None
+
+    # Escritura atómica: varios workers pueden iniciar a la vez
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(comprimido)
+    os.replace(temporal, destino)
+    return destino
+
+def precomprimir(ruta: str) -> dict:
+    """Variantes comprimidas de un archivo: {"br": ruta, "gzip": ruta}"""
+    variantes = {}
+    try:
+        if brotli is not None:
+            destino = escribir_variante(ruta, ".br", lambda datos: brotli.compress(datos, quality=11))
+            if destino:
+                variantes["br"] = destino
+        destino = escribir_variante(ruta, ".gz", lambda datos: gzip.compress(datos, compresslevel=9, mtime=0))
+        if destino:
+            variantes["gzip"] = destino
+    except OSError as e:
+        # Por ejemplo, una carpeta static de solo lectura: se sirve sin comprimir
+        print(f"⚠️  No se pudo precomprimir {ruta}: {e}")
+    return variantes
+
+class ArchivosEstaticos(StaticFiles):
+    """StaticFiles con URLs con huella (caché inmutable) y variantes .br/.gz precomprimidas"""
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.huellas = {}
+        self.variantes = {}
+        self.escanear(directory)
+
+    def escanear(self, directorio: str):
+        """Calcular la huella de cada archivo y generar sus variantes comprimidas"""
+        for raiz, _, archivos in os.walk(directorio):
+            for nombre in archivos:
+                if nombre.endswith((".gz", ".br", ".tmp")):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                relativa = os.path.relpath(ruta, directorio).replace(os.sep, "/")
+                self.huellas[relativa] = huella_archivo(ruta)
+                if os.path.splitext(nombre)[1].lower() in EXTENSIONES_COMPRIMIBLES:
+                    self.variantes[relativa] = precomprimir(ruta)
+
+    def url(self, ruta: str) -> str:
+        """URL con huella de un archivo estático (sin huella si el archivo no existe)"""
+        ruta = ruta.lstrip("/")
+        huella = self.huellas.get(ruta)
+        if huella is None:
+            return f"/static/{ruta}"
+        base, extension = os.path.splitext(ruta)
+        return f"/static/{base}.{huella}{extension}"
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        """Resolver la huella, elegir la variante comprimida y agregar Cache-Control"""
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        relativa = path.replace(os.sep, "/")
+        cache_control = CACHE_REVALIDAR
+        coincidencia = PATRON_HUELLA.match(relativa)
+        if coincidencia:
+            original = coincidencia["base"] + coincidencia["ext"]
+            if original in self.huellas:
+                relativa = original
+                # Una huella vieja (HTML en caché de antes de un cambio) recibe el archivo
+                # actual, pero sin caché larga
+                if self.huellas[original] == coincidencia["huella"]:
+                    cache_control = CACHE_INMUTABLE
+
+        variantes = self.variantes.get(relativa)
+        if variantes is None:
+            response = await super().get_response(relativa, scope)
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        aceptadas = Headers(scope=scope).get("accept-encoding", "")
+        codificacion = next((c for c in ("br", "gzip") if c in variantes and c in aceptadas), None)
+        ruta = variantes[codificacion] if codificacion else os.path.join(self.directory, relativa)
+
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, ruta)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if codificacion:
+            headers["Content-Encoding"] = codificacion
+        response = FileResponse(
+            ruta,
+            stat_result=stat_result,
+            method=scope["method"],
+            headers=headers,
+            media_type=mimetypes.guess_type(relativa)[0] or "text/plain",
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+# ===== COMPRESIÓN DE RESPUESTAS DINÁMICAS =====
+
+TIPOS_COMPRIMIBLES = ("text/html", "application/json", "text/csv")
+
+class _CompresionSelectiva(GZipResponder):
+    """GZipResponder que deja pasar sin tocar lo que no es texto (XLSX ya viene comprimido)
+    y envía cada bloque de una respuesta en streaming apenas se comprime
+    """
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            tipo = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_gzip(message)
+            if not tipo.startswith(TIPOS_COMPRIMIBLES):
+                # Mismo camino que una respuesta con Content-Encoding propio
+                self.content_encoding_set = True
+            return
+        if message.get("more_body", False) and not self.content_encoding_set:
+            # GZipResponder deja los bloques en el compresor hasta el final y la página
+            # llegaría entera de una vez: Z_SYNC_FLUSH vacía el compresor en cada bloque
+            self.gzip_file.write(message.get("body", b""))
+            self.gzip_file.flush(zlib.Z_SYNC_FLUSH)
+            message = {**message, "body": b""}
+        await super().send_with_gzip(message)
+
+class CompresionRespuestas(GZipMiddleware):
+    """GZip para páginas HTML, JSON y CSV de cierto tamaño (los estáticos van precomprimidos)"""
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            responder = _CompresionSelectiva(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,209 @@
+"""
+Exportación de reportes (movimientos, kardex y stock) a CSV y XLSX
+
+Las filas se leen por lotes con yield_per y se escriben a medida que se envían, así que
+exportar años de movimientos usa memoria constante. El CSV empieza a descargarse de
+inmediato; el XLSX se arma con un libro write_only (filas en disco, no en memoria) y se
+envía al terminar de escribirlo.
+"""
+
+import csv
+import io
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+from fastapi import HTTPException, Request
+from sqlalchemy.orm import Session, joinedload
+
+from models import Producto, Movimiento
+from paginacion import orden_movimientos_asc, orden_movimientos_desc
+from plantillas import respuesta_con_sesion
+from stock import obtener_stock_productos, saldo_al, signo_movimiento
+
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+LOTE_EXPORTACION = 1000  # Filas leídas por viaje a la base de datos
+FILAS_POR_BLOQUE_CSV = 500  # Filas por bloque enviado
+TAMANO_BLOQUE_ARCHIVO = 64 * 1024
+
+# Un texto que empieza así se evalúa como fórmula al abrir el archivo en Excel o LibreOffice
+INICIOS_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+def celda_segura(valor):
+    """Texto con ' delante si parece una fórmula (código, nombre o descripción del usuario)"""
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+def fila_segura(fila: Iterable) -> list:
+    """Fila con cada texto pasado por celda_segura (la usan el CSV y el XLSX)"""
+    return [celda_segura(valor) for valor in fila]
+
+def generar_csv(encabezados: list, filas: Iterable) -> Iterable[str]:
+    """CSV por bloques (con BOM para que Excel lo abra como UTF-8)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    escritor.writerow(encabezados)
+    for numero, fila in enumerate(filas, start=1):
+        escritor.writerow(fila_segura(fila))
+        if numero % FILAS_POR_BLOQUE_CSV == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def generar_xlsx(titulo: str, encabezados: list, filas: Iterable) -> Iterable[bytes]:
+    """XLSX con un libro write_only: las filas van a disco y el archivo se envía por partes"""
+    from openpyxl import Workbook  # Solo se necesita al exportar a Excel
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    hoja.append(encabezados)
+    for fila in filas:
+        hoja.append(fila_segura(fila))
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE_ARCHIVO)
+            if not bloque:
+                break
+            yield bloque
+
+def nombre_archivo_seguro(nombre: str) -> str:
+    """Nombre de archivo sin separadores de ruta, comillas ni caracteres fuera de ASCII"""
+    return re.sub(r"[^\w.-]", "_", nombre, flags=re.ASCII)
+
+def respuesta_exportacion(
+    request: Request,
+    nombre: str,
+    formato: str,
+    encabezados: list,
+    filas: Iterable,
+    hoja: str = "Reporte"
+):
+    """Descarga del reporte en el formato pedido (csv o xlsx)
+
+    hoja es el título fijo de la hoja de Excel: no debe incluir datos del usuario
+    (openpyxl rechaza caracteres como / ? * [ ] : en los títulos).
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato} (csv o xlsx)")
+
+    if formato == "csv":
+        contenido = generar_csv(encabezados, filas)
+    else:
+        contenido = generar_xlsx(hoja, encabezados, filas)
+
+    archivo = nombre_archivo_seguro(f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}")
+    return respuesta_con_sesion(
+        request,
+        contenido,
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'}
+    )
+
+def si_no(valor) -> str:
+    """Booleano como texto para las planillas"""
+    return "Sí" if valor else "No"
+
+# ===== REPORTES =====
+
+ENCABEZADOS_MOVIMIENTOS = ["Fecha", "Código", "Producto", "Tipo", "Cantidad", "Unidad", "Descripción", "Registrado"]
+
+def filas_movimientos(
+    db: Session,
+    producto_id: Optional[int] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None
+):
+    """Movimientos filtrados, del más reciente al más antiguo (como en la página)"""
+    query = db.query(Movimiento)
+    if producto_id:
+        query = query.filter(Movimiento.producto_id == producto_id)
+    if fecha_inicio:
+        query = query.filter(Movimiento.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Movimiento.fecha <= fecha_fin)
+
+    movimientos = (
+        query.options(joinedload(Movimiento.producto).joinedload(Producto.unidad_rel))
+        .order_by(*orden_movimientos_desc())
+        .yield_per(LOTE_EXPORTACION)
+    )
+    for movimiento in movimientos:
+        producto = movimiento.producto
+        yield [
+            movimiento.fecha,
+            producto.codigo,
+            producto.nombre,
+            movimiento.tipo,
+            movimiento.cantidad,
+            producto.unidad_rel.abreviatura if producto.unidad_rel else "",
+            movimiento.descripcion or "",
+            movimiento.fecha_creacion,
+        ]
+
+ENCABEZADOS_KARDEX = ["Fecha", "Tipo", "Entrada", "Salida", "Saldo", "Descripción", "Registrado"]
+
+def filas_kardex(
+    db: Session,
+    producto_id: int,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None
+):
+    """Kardex en orden cronológico, con saldo inicial y saldo progresivo
+
+    El saldo inicial sale del último cierre de período (saldo_al), y el progresivo se
+    acumula mientras se recorren los movimientos.
+    """
+    saldo = saldo_al(db, producto_id, fecha_inicio - timedelta(days=1)) if fecha_inicio else 0.0
+    if fecha_inicio:
+        yield [fecha_inicio, "Saldo anterior", None, None, saldo, "", None]
+
+    query = db.query(Movimiento).filter(Movimiento.producto_id == producto_id)
+    if fecha_inicio:
+        query = query.filter(Movimiento.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Movimiento.fecha <= fecha_fin)
+
+    for movimiento in query.order_by(*orden_movimientos_asc()).yield_per(LOTE_EXPORTACION):
+        es_entrada = signo_movimiento(movimiento.tipo) > 0
+        saldo += signo_movimiento(movimiento.tipo) * movimiento.cantidad
+        yield [
+            movimiento.fecha,
+            movimiento.tipo,
+            movimiento.cantidad if es_entrada else None,
+            None if es_entrada else movimiento.cantidad,
+            saldo,
+            movimiento.descripcion or "",
+            movimiento.fecha_creacion,
+        ]
+
+ENCABEZADOS_STOCK = ["Código", "Producto", "Grupo", "Unidad", "Stock actual", "Stock mínimo", "Stock bajo", "Activo"]
+
+def filas_stock(db: Session, incluir_inactivos: bool = False, solo_stock_bajo: bool = False):
+    """Stock actual de los productos (o solo los de stock bajo), ordenados por id (como en la página)"""
+    filas = obtener_stock_productos(
+        db,
+        solo_activos=not incluir_inactivos,
+        solo_stock_bajo=solo_stock_bajo,
+        por_lotes=LOTE_EXPORTACION
+    )
+    for producto, stock_actual, stock_bajo in filas:
+        yield [
+            producto.codigo,
+            producto.nombre,
+            producto.grupo_rel.nombre if producto.grupo_rel else "",
+            producto.unidad_rel.abreviatura if producto.unidad_rel else "",
+            stock_actual,
+            producto.stock_minimo or 0,
+            si_no(stock_bajo),
+            si_no(producto.activo),
+        ]
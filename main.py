@@ -1,110 +1,324 @@
 from fastapi import FastAPI, Request, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
 from typing import Optional, List
 from datetime import datetime, date, timedelta
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import re
+import time
 import uvicorn
 
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine
 from models import Producto, Movimiento, Unidad, Grupo, Usuario, RolUsuario
+from stock import (
+    registrar_movimiento, inicializar_stock, obtener_stock, obtener_stock_productos,
+    resumen_stock, saldo_al, pagina_kardex, generar_cierres, actualizar_stock_bajo
+)
+from migraciones import preparar_base_datos, esquema_actualizado
+from cache import cache, datos_referencia, incrementar_version, ValidadorPagina
+from api import router as api_router
+from exportar import (
+    respuesta_exportacion, filas_movimientos, filas_kardex, filas_stock,
+    ENCABEZADOS_MOVIMIENTOS, ENCABEZADOS_KARDEX, ENCABEZADOS_STOCK
+)
+from plantillas import templates, respuesta_streaming, FilasEnStreaming
+from estaticos import ArchivosEstaticos, CompresionRespuestas
+from busqueda import buscar_ids_productos, LIMITE_RESULTADOS
+from paginacion import cursor_id, leer_cursor_id, cursor_movimiento, leer_cursor_movimiento, anteriores_a, orden_movimientos_desc
 from schemas import ProductoCreate, MovimientoCreate, UnidadCreate, GrupoCreate, UsuarioCreate, UsuarioUpdate, LoginRequest, Token
 from auth import (
-    authenticate_user, create_access_token, get_current_active_user, 
-    get_password_hash, require_admin, require_operador_or_admin,
-    ACCESS_TOKEN_EXPIRE_MINUTES, can_access_module
+    authenticate_user_async, create_access_token, get_current_active_user, 
+    get_password_hash_async, verify_password_async, limite_por_usuario,
+    registrar_acceso, guardar_accesos_pendientes, tarea_guardar_accesos,
+    require_admin, require_operador_or_admin,
+    ACCESS_TOKEN_EXPIRE_MINUTES, can_access_module, get_db
 )
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+# ===== INICIO Y CIERRE DE LA APLICACIÓN =====
 
-app = FastAPI(title="Sistema de Control de Inventario", version="1.0.0")
+# Frecuencia con que cada worker revisa si hay períodos nuevos para cerrar (incremental:
+# sin períodos terminados pendientes, solo son dos consultas)
+INTERVALO_CIERRES = int(os.getenv("INVENTARIO_INTERVALO_CIERRES", 3600))  # Segundos
 
-# Configurar templates y archivos estáticos
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+def verificar_esquema():
+    """Verificación rápida de versión; solo crea tablas y migra si hay cambios pendientes"""
+    if not esquema_actualizado(engine):
+        preparar_base_datos(engine)
 
-# Dependencia para obtener la sesión de base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def generar_cierres_pendientes():
+    """Generar los cierres de los períodos terminados (incremental)"""
+    with SessionLocal() as db:
+        generar_cierres(db)
 
-# Rutas principales
-@app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
-    """Dashboard principal con resumen del inventario"""
-    productos = db.query(Producto).all()
-    total_productos = len(productos)
+async def tarea_generar_cierres():
+    """Tarea de fondo: generar cada INTERVALO_CIERRES segundos los cierres de los períodos que terminan"""
+    while True:
+        await asyncio.sleep(INTERVALO_CIERRES)
+        try:
+            await run_in_threadpool(generar_cierres_pendientes)
+        except Exception as e:
+            print(f"⚠️  Error al generar cierres de stock: {e}")
+
+def calentar_datos_referencia():
+    """Cargar unidades y grupos activos en la caché"""
+    with SessionLocal() as db:
+        datos_referencia(db)
+
+def calentar_dashboard():
+    """Calcular el resumen del dashboard para que la primera visita lo encuentre en caché"""
+    with SessionLocal() as db:
+        resumen_dashboard(db)
+
+def precompilar_templates():
+    """Compilar las plantillas antes de la primera request"""
+    for nombre in os.listdir("templates"):
+        if nombre.endswith(".html"):
+            templates.get_template(nombre)
+
+async def medir(funcion):
+    """Ejecutar una función bloqueante en el pool de hilos y devolver su duración"""
+    inicio = time.perf_counter()
+    await run_in_threadpool(funcion)
+    return time.perf_counter() - inicio
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Preparar la base de datos y las cachés al iniciar; guardar pendientes al cerrar"""
+    inicio = time.perf_counter()
+    # Con varios workers, ejecutar_produccion.py ya preparó la base de datos una sola vez
+    bd_preparada = os.getenv("INVENTARIO_BD_PREPARADA") == "1"
+    
+    t_esquema = 0.0 if bd_preparada else await medir(verificar_esquema)
+    t_referencia, t_dashboard, t_templates = await asyncio.gather(
+        medir(calentar_datos_referencia),
+        medir(calentar_dashboard),
+        medir(precompilar_templates)
+    )
     
-    # Calcular stock total y detectar productos con stock bajo
-    stock_total = 0
-    productos_stock_bajo = []
+    # Los cierres se siguen generando mientras el servidor está en marcha, para que el
+    # kardex no vuelva a recorrer cada vez más movimientos posteriores al último cierre
+    tareas = [asyncio.create_task(tarea_guardar_accesos()), asyncio.create_task(tarea_generar_cierres())]
+    if not bd_preparada:
+        tareas.append(asyncio.create_task(run_in_threadpool(generar_cierres_pendientes)))
     
-    for producto in productos:
-        stock_actual = calcular_stock_actual(db, producto.id)
-        stock_total += stock_actual
-        
-        # Verificar stock bajo
-        stock_minimo = producto.stock_minimo or 0
-        if stock_minimo > 0 and stock_actual <= stock_minimo:
-            productos_stock_bajo.append({
-                "producto": producto,
-                "stock_actual": stock_actual,
-                "stock_minimo": stock_minimo
-            })
+    print(
+        f"⏱️  Inicio en {time.perf_counter() - inicio:.2f}s "
+        f"(esquema {t_esquema:.2f}s, referencia {t_referencia:.2f}s, "
+        f"dashboard {t_dashboard:.2f}s, plantillas {t_templates:.2f}s)"
+    )
+    
+    yield
+    
+    # Detener las tareas de fondo y guardar los accesos pendientes
+    for tarea in tareas:
+        tarea.cancel()
+    await run_in_threadpool(guardar_accesos_pendientes)
+
+app = FastAPI(title="Sistema de Control de Inventario", version="1.0.0", lifespan=lifespan)
+
+# Paginación de los listados de movimientos y productos
+TAMANO_PAGINA_MOVIMIENTOS = 100
+TAMANO_PAGINA_PRODUCTOS = 100
+
+# Productos con stock bajo que se muestran en el dashboard (el resto en /stock-bajo)
+LIMITE_STOCK_BAJO_DASHBOARD = 20
+DIAS_VENTANA_MOVIMIENTOS = 30  # Ventana por defecto cuando no se indica ningún filtro
+
+# Filas leídas por viaje a la base de datos en las páginas que se envían en streaming
+LOTE_STREAMING = 200
+
+# Archivos estáticos con huella y precomprimidos (las plantillas se configuran en plantillas.py)
+archivos_estaticos = ArchivosEstaticos(directory="static")
+app.mount("/static", archivos_estaticos, name="static")
+templates.env.globals["estatico"] = archivos_estaticos.url
+
+# Compresión gzip de las páginas y respuestas JSON/CSV grandes
+app.add_middleware(CompresionRespuestas)
+
+# API JSON para clientes (escáneres, ERP): ver api.py
+app.include_router(api_router)
+
+# Rutas principales
+# Las rutas que usan la base de datos se declaran con def (no async def): FastAPI las
+# ejecuta en su pool de hilos y las consultas bloqueantes no detienen el event loop.
+# Las rutas de contraseñas son async: esperan a bcrypt en el pool de auth.py y
+# ejecutan sus consultas con run_in_threadpool
+def calcular_resumen_dashboard(db: Session) -> dict:
+    """Totales, productos con stock bajo y movimientos recientes, como datos simples para la caché"""
+    # Totales y productos con stock bajo calculados en la base de datos
+    total_productos, stock_total, total_stock_bajo = resumen_stock(db)
+    
+    # Los primeros del conjunto de stock bajo (marca materializada, sin recalcular saldos);
+    # la lista completa está en /stock-bajo
+    productos_stock_bajo = [
+        {
+            "producto": {"id": producto.id, "codigo": producto.codigo, "nombre": producto.nombre},
+            "stock_actual": stock_actual,
+            "stock_minimo": producto.stock_minimo or 0
+        }
+        for producto, stock_actual, _ in obtener_stock_productos(
+            db, solo_stock_bajo=True, limite=LIMITE_STOCK_BAJO_DASHBOARD
+        )
+    ]
     
     # Movimientos recientes
-    movimientos_recientes = (
-        db.query(Movimiento)
-        .order_by(Movimiento.fecha.desc(), Movimiento.fecha_creacion.desc())
-        .limit(10)
-        .all()
-    )
+    movimientos_recientes = [
+        {
+            "fecha": movimiento.fecha,
+            "producto_id": movimiento.producto_id,
+            "producto": {"codigo": movimiento.producto.codigo} if movimiento.producto else None,
+            "tipo": movimiento.tipo,
+            "cantidad": movimiento.cantidad,
+            "descripcion": movimiento.descripcion
+        }
+        for movimiento in (
+            db.query(Movimiento)
+            .options(joinedload(Movimiento.producto))
+            .order_by(*orden_movimientos_desc())
+            .limit(10)
+        )
+    ]
     
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
+    return {
         "total_productos": total_productos,
         "stock_total": stock_total,
         "movimientos_recientes": movimientos_recientes,
         "productos_stock_bajo": productos_stock_bajo,
+        "total_stock_bajo": total_stock_bajo
+    }
+
+def resumen_dashboard(db: Session) -> dict:
+    """Resumen del dashboard desde la caché; se recalcula al registrar productos o movimientos"""
+    return cache.obtener(db, "dashboard", ("productos", "movimientos"), calcular_resumen_dashboard)
+
+@app.get("/", response_class=HTMLResponse)
+def dashboard(request: Request, db: Session = Depends(get_db)):
+    """Dashboard principal con resumen del inventario"""
+    return templates.TemplateResponse("dashboard.html", {
+        "request": request,
+        **resumen_dashboard(db),
         "date": date
     })
 
 @app.get("/productos", response_class=HTMLResponse)
-async def listar_productos(request: Request, incluir_inactivos: bool = False, db: Session = Depends(get_db)):
-    """Página para listar y gestionar productos"""
-    if incluir_inactivos:
-        productos = db.query(Producto).all()
+def listar_productos(
+    request: Request,
+    incluir_inactivos: bool = False,
+    q: str = "",
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Página para listar y gestionar productos (paginada por id, o resultados de búsqueda)"""
+    referencia = datos_referencia(db)
+    busqueda = q.strip()
+    
+    if busqueda:
+        # Coincidencias del índice de búsqueda, en orden de relevancia
+        ids = buscar_ids_productos(db, busqueda, solo_activos=not incluir_inactivos)
+        por_id = {fila[0].id: fila for fila in obtener_stock_productos(db, producto_ids=ids)}
+        filas = [por_id[producto_id] for producto_id in ids if producto_id in por_id]
+        paginacion = {}
     else:
-        productos = db.query(Producto).filter(Producto.activo == True).all()
-    unidades = db.query(Unidad).filter(Unidad.activo == True).order_by(Unidad.nombre.asc()).all()
-    grupos = db.query(Grupo).filter(Grupo.activo == True).order_by(Grupo.nombre.asc()).all()
-    
-    # Calcular stock actual para cada producto
-    productos_con_stock = []
-    for producto in productos:
-        stock_actual = calcular_stock_actual(db, producto.id)
-        productos_con_stock.append({
-            "producto": producto,
-            "stock_actual": stock_actual
-        })
+        # Stock actual de una página de productos en una sola consulta, leída por lotes
+        # mientras se envía la página; la fila extra indica si hay más páginas
+        try:
+            despues_de = leer_cursor_id(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filas = obtener_stock_productos(
+            db,
+            solo_activos=not incluir_inactivos,
+            por_lotes=LOTE_STREAMING,
+            despues_de=despues_de,
+            limite=TAMANO_PAGINA_PRODUCTOS + 1
+        )
+        paginacion = {"limite": TAMANO_PAGINA_PRODUCTOS, "cursor_de": lambda item: cursor_id(item["producto"].id)}
     
-    return templates.TemplateResponse("productos.html", {
-        "request": request,
+    productos_con_stock = FilasEnStreaming(
+        (
+            {
+                "producto": producto,
+                "stock_actual": stock_actual,
+                "stock_bajo": stock_bajo
+            }
+            for producto, stock_actual, stock_bajo in filas
+        ),
+        **paginacion
+    )
+    
+    return respuesta_streaming(request, "productos.html", {
         "productos_con_stock": productos_con_stock,
-        "unidades": unidades,
-        "grupos": grupos,
+        "unidades": referencia["unidades"],
+        "grupos": referencia["grupos"],
         "incluir_inactivos": incluir_inactivos,
+        "busqueda": busqueda,
+        "limite_busqueda": LIMITE_RESULTADOS,
+        "es_primera_pagina": cursor is None,
+        "params_filtro": "incluir_inactivos=true" if incluir_inactivos else "",
         "date": date
     })
 
+@app.get("/productos/exportar")
+def exportar_productos(
+    request: Request,
+    formato: str = "csv",
+    incluir_inactivos: bool = False,
+    solo_stock_bajo: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Descargar el stock de los productos (o solo los de stock bajo) en CSV o Excel"""
+    filas = filas_stock(db, incluir_inactivos=incluir_inactivos, solo_stock_bajo=solo_stock_bajo)
+    nombre = "stock_bajo" if solo_stock_bajo else "stock"
+    return respuesta_exportacion(request, nombre, formato, ENCABEZADOS_STOCK, filas, hoja="Stock")
+
+@app.get("/stock-bajo", response_class=HTMLResponse)
+def listar_stock_bajo(
+    request: Request,
+    incluir_inactivos: bool = False,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Productos a reponer: el conjunto de stock bajo, paginado por id"""
+    try:
+        despues_de = leer_cursor_id(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filas = obtener_stock_productos(
+        db,
+        solo_activos=not incluir_inactivos,
+        solo_stock_bajo=True,
+        por_lotes=LOTE_STREAMING,
+        despues_de=despues_de,
+        limite=TAMANO_PAGINA_PRODUCTOS + 1
+    )
+    productos = FilasEnStreaming(
+        (
+            {
+                "producto": producto,
+                "stock_actual": stock_actual,
+                "faltante": (producto.stock_minimo or 0) - stock_actual
+            }
+            for producto, stock_actual, _ in filas
+        ),
+        limite=TAMANO_PAGINA_PRODUCTOS,
+        cursor_de=lambda item: cursor_id(item["producto"].id)
+    )
+    
+    return respuesta_streaming(request, "stock_bajo.html", {
+        "productos": productos,
+        "incluir_inactivos": incluir_inactivos,
+        "es_primera_pagina": cursor is None,
+        "params_filtro": "incluir_inactivos=true" if incluir_inactivos else ""
+    })
+
 @app.post("/productos")
-async def crear_producto(
+def crear_producto(
     request: Request,
     codigo: str = Form(...),
     nombre: str = Form(...),
@@ -149,12 +363,15 @@ async def crear_producto(
         stock_minimo=stock_minimo
     )
     db.add(producto)
+    db.flush()  # Para obtener el ID del producto
+    inicializar_stock(db, producto.id)
+    incrementar_version(db, "productos")
     db.commit()
     
     return RedirectResponse(url="/productos", status_code=303)
 
 @app.put("/productos/{producto_id}")
-async def editar_producto(
+def editar_producto(
     request: Request,
     producto_id: int,
     codigo: str = Form(...),
@@ -202,6 +419,7 @@ async def editar_producto(
     if not grupo:
         raise HTTPException(status_code=400, detail="Grupo no encontrado o inactivo")
     
+    cambio_minimo = (producto.stock_minimo or 0.0) != stock_minimo
     producto.codigo = codigo
     producto.nombre = nombre
     producto.unidad_id = unidad_id
@@ -209,11 +427,17 @@ async def editar_producto(
     producto.stock_minimo = stock_minimo
     producto.activo = activo.lower() == "true"
     
+    # El nuevo mínimo puede sacar o agregar el producto al conjunto de stock bajo
+    if cambio_minimo:
+        db.flush()
+        actualizar_stock_bajo(db, [producto.id])
+    
+    incrementar_version(db, "productos")
     db.commit()
     return RedirectResponse(url="/productos", status_code=303)
 
 @app.post("/productos/{producto_id}/edit")
-async def editar_producto_post(
+def editar_producto_post(
     request: Request,
     producto_id: int,
     codigo: str = Form(...),
@@ -225,10 +449,10 @@ async def editar_producto_post(
     db: Session = Depends(get_db)
 ):
     """Ruta POST para editar producto (compatible con formularios)"""
-    return await editar_producto(request, producto_id, codigo, nombre, unidad_id, grupo_id, stock_minimo, activo, db)
+    return editar_producto(request, producto_id, codigo, nombre, unidad_id, grupo_id, stock_minimo, activo, db)
 
 @app.post("/productos/{producto_id}/toggle")
-async def toggle_producto_activo(request: Request, producto_id: int, db: Session = Depends(get_db)):
+def toggle_producto_activo(request: Request, producto_id: int, db: Session = Depends(get_db)):
     """Activar/desactivar un producto"""
     # Obtener usuario actual del middleware
     current_user = getattr(request.state, 'current_user', None)
@@ -244,12 +468,13 @@ async def toggle_producto_activo(request: Request, producto_id: int, db: Session
     
     # Cambiar el estado activo
     producto.activo = not producto.activo
+    incrementar_version(db, "productos")
     db.commit()
     
     return RedirectResponse(url="/productos", status_code=303)
 
 @app.get("/unidades", response_class=HTMLResponse)
-async def listar_unidades(request: Request, db: Session = Depends(get_db)):
+def listar_unidades(request: Request, db: Session = Depends(get_db)):
     """Página para listar y gestionar unidades de medida"""
     unidades = db.query(Unidad).order_by(Unidad.nombre.asc()).all()
     
@@ -260,7 +485,7 @@ async def listar_unidades(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/unidades")
-async def crear_unidad(
+def crear_unidad(
     request: Request,
     nombre: str = Form(...),
     abreviatura: str = Form(...),
@@ -287,13 +512,14 @@ async def crear_unidad(
         activo=bool(activo)
     )
     db.add(unidad)
+    incrementar_version(db, "unidades")
     db.commit()
     
     return RedirectResponse(url="/unidades", status_code=303)
 
 # === RUTAS DE GRUPOS ===
 @app.get("/grupos", response_class=HTMLResponse)
-async def listar_grupos(request: Request, db: Session = Depends(get_db)):
+def listar_grupos(request: Request, db: Session = Depends(get_db)):
     """Página para listar y gestionar grupos"""
     grupos = db.query(Grupo).order_by(Grupo.nombre.asc()).all()
     
@@ -304,7 +530,7 @@ async def listar_grupos(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/grupos")
-async def crear_grupo(
+def crear_grupo(
     request: Request,
     nombre: str = Form(...),
     descripcion: str = Form(""),
@@ -331,12 +557,13 @@ async def crear_grupo(
         activo=bool(activo)
     )
     db.add(grupo)
+    incrementar_version(db, "grupos")
     db.commit()
     
     return RedirectResponse(url="/grupos", status_code=303)
 
 @app.post("/grupos/{grupo_id}/toggle")
-async def toggle_grupo_activo(request: Request, grupo_id: int, db: Session = Depends(get_db)):
+def toggle_grupo_activo(request: Request, grupo_id: int, db: Session = Depends(get_db)):
     """Activar/desactivar un grupo"""
     # Obtener usuario actual del middleware
     current_user = getattr(request.state, 'current_user', None)
@@ -351,12 +578,13 @@ async def toggle_grupo_activo(request: Request, grupo_id: int, db: Session = Dep
         raise HTTPException(status_code=404, detail="Grupo no encontrado")
     
     grupo.activo = not grupo.activo
+    incrementar_version(db, "grupos")
     db.commit()
     
     return RedirectResponse(url="/grupos", status_code=303)
 
 @app.post("/unidades/{unidad_id}/toggle")
-async def toggle_unidad_activo(request: Request, unidad_id: int, db: Session = Depends(get_db)):
+def toggle_unidad_activo(request: Request, unidad_id: int, db: Session = Depends(get_db)):
     """Activar/desactivar una unidad"""
     # Obtener usuario actual del middleware
     current_user = getattr(request.state, 'current_user', None)
@@ -371,19 +599,25 @@ async def toggle_unidad_activo(request: Request, unidad_id: int, db: Session = D
         raise HTTPException(status_code=404, detail="Unidad no encontrada")
     
     unidad.activo = not unidad.activo
+    incrementar_version(db, "unidades")
     db.commit()
     
     return RedirectResponse(url="/unidades", status_code=303)
 
 @app.get("/movimientos", response_class=HTMLResponse)
-async def listar_movimientos(
+def listar_movimientos(
     request: Request,
     producto_id: Optional[int] = None,
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Página para listar movimientos con filtros"""
+    """Página para listar movimientos con filtros (paginado, más recientes primero)"""
+    # Sin filtros se muestran solo los últimos días para no recorrer todo el historial
+    if not producto_id and not fecha_inicio and not fecha_fin:
+        fecha_inicio = (date.today() - timedelta(days=DIAS_VENTANA_MOVIMIENTOS)).strftime("%Y-%m-%d")
+    
     query = db.query(Movimiento)
     
     # Aplicar filtros
@@ -398,23 +632,67 @@ async def listar_movimientos(
         fecha_fin_obj = datetime.strptime(fecha_fin, "%Y-%m-%d").date()
         query = query.filter(Movimiento.fecha <= fecha_fin_obj)
     
-    movimientos = query.order_by(Movimiento.fecha.desc(), Movimiento.fecha_creacion.desc()).all()
-    productos = db.query(Producto).filter(Producto.activo == True).all()
+    total_movimientos = query.count()
     
-    return templates.TemplateResponse("movimientos.html", {
-        "request": request,
+    # Página actual: movimientos anteriores al cursor, con producto y unidad en la misma consulta
+    if cursor:
+        try:
+            query = query.filter(anteriores_a(leer_cursor_movimiento(cursor)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Se lee por lotes mientras se renderiza; la fila extra indica si hay más páginas
+    movimientos = FilasEnStreaming(
+        query.options(joinedload(Movimiento.producto).joinedload(Producto.unidad_rel))
+        .order_by(*orden_movimientos_desc())
+        .limit(TAMANO_PAGINA_MOVIMIENTOS + 1)
+        .yield_per(LOTE_STREAMING),
+        limite=TAMANO_PAGINA_MOVIMIENTOS,
+        cursor_de=cursor_movimiento
+    )
+    
+    # El formulario busca el producto al escribir: solo se carga el que viene en la URL
+    producto_seleccionado = db.get(Producto, producto_id) if producto_id else None
+    hay_productos = producto_seleccionado is not None or (
+        db.query(Producto.id).filter(Producto.activo == True).first() is not None
+    )
+    
+    filtros = {
+        "producto_id": producto_id,
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin
+    }
+    
+    return respuesta_streaming(request, "movimientos.html", {
         "movimientos": movimientos,
-        "productos": productos,
-        "filtros": {
-            "producto_id": producto_id,
-            "fecha_inicio": fecha_inicio,
-            "fecha_fin": fecha_fin
-        },
+        "producto_seleccionado": producto_seleccionado,
+        "hay_productos": hay_productos,
+        "filtros": filtros,
+        "total_movimientos": total_movimientos,
+        "tamano_pagina": TAMANO_PAGINA_MOVIMIENTOS,
+        "es_primera_pagina": cursor is None,
+        "params_filtro": urlencode({clave: valor for clave, valor in filtros.items() if valor}),
         "date": date
     })
 
+@app.get("/movimientos/exportar")
+def exportar_movimientos(
+    request: Request,
+    formato: str = "csv",
+    producto_id: Optional[int] = None,
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Descargar los movimientos con los mismos filtros de la página, en CSV o Excel"""
+    fecha_inicio_obj = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
+    fecha_fin_obj = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
+    
+    filas = filas_movimientos(db, producto_id, fecha_inicio_obj, fecha_fin_obj)
+    return respuesta_exportacion(request, "movimientos", formato, ENCABEZADOS_MOVIMIENTOS, filas, hoja="Movimientos")
+
 @app.post("/movimientos")
-async def crear_movimiento(
+def crear_movimiento(
     request: Request,
     producto_id: int = Form(...),
     tipo: str = Form(...),
@@ -446,60 +724,50 @@ async def crear_movimiento(
         descripcion=descripcion,
         fecha=fecha_obj
     )
-    db.add(movimiento)
+    registrar_movimiento(db, movimiento)
     db.commit()
     
     return RedirectResponse(url="/movimientos", status_code=303)
 
 @app.get("/kardex/{producto_id}", response_class=HTMLResponse)
-async def kardex_producto(
+def kardex_producto(
     request: Request,
     producto_id: int,
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Página del kardex de un producto específico"""
+    """Página del kardex de un producto específico (paginado, más recientes primero)"""
     producto = db.query(Producto).filter(Producto.id == producto_id).first()
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    query = db.query(Movimiento).filter(Movimiento.producto_id == producto_id)
-    
-    # Aplicar filtros de fecha
-    if fecha_inicio:
-        fecha_inicio_obj = datetime.strptime(fecha_inicio, "%Y-%m-%d").date()
-        query = query.filter(Movimiento.fecha >= fecha_inicio_obj)
-    
-    if fecha_fin:
-        fecha_fin_obj = datetime.strptime(fecha_fin, "%Y-%m-%d").date()
-        query = query.filter(Movimiento.fecha <= fecha_fin_obj)
+    fecha_inicio_obj = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
+    fecha_fin_obj = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
     
-    # Obtener movimientos ordenados cronológicamente para cálculo de saldos
-    movimientos_cronologicos = query.order_by(Movimiento.fecha.asc(), Movimiento.fecha_creacion.asc()).all()
+    try:
+        anterior_a = leer_cursor_movimiento(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Calcular saldos progresivos
-    kardex = []
-    saldo = 0
+    # Movimientos de la página con saldos progresivos calculados en SQL
+    kardex, hay_mas = pagina_kardex(db, producto_id, fecha_inicio_obj, fecha_fin_obj, anterior_a)
+    siguiente_cursor = cursor_movimiento(kardex[-1]["movimiento"]) if hay_mas else None
     
-    for movimiento in movimientos_cronologicos:
-        if movimiento.tipo == "entrada":
-            saldo += movimiento.cantidad
-        else:  # salida
-            saldo -= movimiento.cantidad
-        
-        kardex.append({
-            "movimiento": movimiento,
-            "saldo": saldo
-        })
-    
-    # Invertir el kardex para mostrar los movimientos más recientes primero
-    kardex.reverse()
+    # Saldo inicial: saldo al día anterior al filtro (último cierre + movimientos posteriores)
+    saldo_inicial = 0
+    if fecha_inicio_obj and not hay_mas:
+        saldo_inicial = saldo_al(db, producto_id, fecha_inicio_obj - timedelta(days=1))
     
     return templates.TemplateResponse("kardex.html", {
         "request": request,
         "producto": producto,
         "kardex": kardex,
+        "stock_actual": calcular_stock_actual(db, producto_id),
+        "saldo_inicial": saldo_inicial,
+        "siguiente_cursor": siguiente_cursor,
+        "es_primera_pagina": cursor is None,
         "filtros": {
             "fecha_inicio": fecha_inicio,
             "fecha_fin": fecha_fin
@@ -507,20 +775,31 @@ async def kardex_producto(
         "date": date
     })
 
-def calcular_stock_actual(db: Session, producto_id: int) -> float:
-    """Calcular el stock actual de un producto"""
-    movimientos = db.query(Movimiento).filter(
-        Movimiento.producto_id == producto_id
-    ).all()
+@app.get("/kardex/{producto_id}/exportar")
+def exportar_kardex(
+    request: Request,
+    producto_id: int,
+    formato: str = "csv",
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Descargar el kardex completo de un producto (orden cronológico) en CSV o Excel"""
+    producto = db.query(Producto).filter(Producto.id == producto_id).first()
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    stock = 0
-    for movimiento in movimientos:
-        if movimiento.tipo == "entrada":
-            stock += movimiento.cantidad
-        else:  # salida
-            stock -= movimiento.cantidad
+    fecha_inicio_obj = datetime.strptime(fecha_inicio, "%Y-%m-%d").date() if fecha_inicio else None
+    fecha_fin_obj = datetime.strptime(fecha_fin, "%Y-%m-%d").date() if fecha_fin else None
     
-    return stock
+    filas = filas_kardex(db, producto_id, fecha_inicio_obj, fecha_fin_obj)
+    return respuesta_exportacion(
+        request, f"kardex_{producto.codigo}", formato, ENCABEZADOS_KARDEX, filas, hoja="Kardex"
+    )
+
+def calcular_stock_actual(db: Session, producto_id: int) -> float:
+    """Obtener el stock actual de un producto desde el saldo materializado"""
+    return obtener_stock(db, producto_id)
 
 # ===== RUTAS DE AUTENTICACIÓN Y GESTIÓN DE USUARIOS =====
 
@@ -536,10 +815,17 @@ async def login(
     password: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    """Autenticar usuario"""
+    """Autenticar usuario (bcrypt se ejecuta en el pool de hash de auth.py)"""
     print(f"Intento de login para usuario: {username}")
     
-    user = authenticate_user(db, username, password)
+    try:
+        user = await authenticate_user_async(db, username, password)
+    except HTTPException as e:
+        print(f"Login rechazado para usuario: {username} ({e.detail})")
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Demasiados intentos simultáneos, espera un momento e inténtalo de nuevo"
+        }, status_code=e.status_code)
     if not user:
         print(f"Login fallido para usuario: {username}")
         return templates.TemplateResponse("login.html", {
@@ -578,7 +864,7 @@ async def logout():
     return response
 
 @app.get("/usuarios", response_class=HTMLResponse)
-async def listar_usuarios(
+def listar_usuarios(
     request: Request, 
     db: Session = Depends(get_db)
 ):
@@ -625,13 +911,13 @@ async def crear_usuario(
         raise HTTPException(status_code=403, detail="Se requiere rol de administrador")
     
     # Verificar si el username ya existe
-    usuario_existente = db.query(Usuario).filter(Usuario.username == username).first()
+    usuario_existente = await run_in_threadpool(db.query(Usuario).filter(Usuario.username == username).first)
     if usuario_existente:
         print(f"Username {username} ya existe")
         raise HTTPException(status_code=400, detail="El nombre de usuario ya existe")
     
     # Verificar si el email ya existe
-    email_existente = db.query(Usuario).filter(Usuario.email == email).first()
+    email_existente = await run_in_threadpool(db.query(Usuario).filter(Usuario.email == email).first)
     if email_existente:
         print(f"Email {email} ya existe")
         raise HTTPException(status_code=400, detail="El email ya está registrado")
@@ -646,22 +932,22 @@ async def crear_usuario(
             username=username,
             email=email,
             nombre_completo=nombre_completo,
-            hashed_password=get_password_hash(password),
+            hashed_password=await get_password_hash_async(password),
             rol=rol
         )
         
         db.add(usuario)
-        db.commit()
+        await run_in_threadpool(db.commit)
         print(f"Usuario {username} creado exitosamente")
         
         return RedirectResponse(url="/usuarios", status_code=303)
     except Exception as e:
         print(f"Error al crear usuario: {e}")
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 @app.post("/usuarios/{usuario_id}/toggle")
-async def toggle_usuario_activo(
+def toggle_usuario_activo(
     request: Request,
     usuario_id: int,
     db: Session = Depends(get_db)
@@ -706,12 +992,12 @@ async def cambiar_password_usuario(
     if current_user.rol != RolUsuario.ADMIN.value:
         raise HTTPException(status_code=403, detail="Se requiere rol de administrador")
     
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    usuario = await run_in_threadpool(db.query(Usuario).filter(Usuario.id == usuario_id).first)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    usuario.hashed_password = get_password_hash(password_nueva)
-    db.commit()
+    usuario.hashed_password = await get_password_hash_async(password_nueva)
+    await run_in_threadpool(db.commit)
     
     return RedirectResponse(url="/usuarios", status_code=303)
 
@@ -743,55 +1029,113 @@ async def cambiar_password_perfil(
     if not current_user:
         return RedirectResponse(url="/login", status_code=303)
     
-    from auth import verify_password
+    async with limite_por_usuario(current_user.username):
+        if not await verify_password_async(password_actual, current_user.hashed_password):
+            raise HTTPException(status_code=400, detail="Contraseña actual incorrecta")
     
-    if not verify_password(password_actual, current_user.hashed_password):
-        raise HTTPException(status_code=400, detail="Contraseña actual incorrecta")
-    
-    current_user.hashed_password = get_password_hash(password_nueva)
-    db.commit()
+    current_user.hashed_password = await get_password_hash_async(password_nueva)
+    await run_in_threadpool(db.commit)
     
     return RedirectResponse(url="/perfil?success=password_changed", status_code=303)
 
 # ===== MIDDLEWARE DE AUTENTICACIÓN =====
 
+def buscar_usuario_activo(db: Session, username: str) -> Optional[Usuario]:
+    """Buscar el usuario del token (consulta bloqueante, se ejecuta fuera del event loop)"""
+    user = db.query(Usuario).filter(Usuario.username == username).first()
+    return user if user and user.activo else None
+
+# Páginas que responden 304 Not Modified si no cambiaron las tablas de las que dependen
+PAGINAS_CONDICIONALES = [
+    (re.compile(r"/"), ("productos", "movimientos")),
+    (re.compile(r"/productos"), ("productos", "movimientos", "unidades", "grupos")),
+    (re.compile(r"/movimientos"), ("productos", "movimientos", "unidades")),
+    (re.compile(r"/kardex/\d+"), ("productos", "movimientos", "unidades", "grupos")),
+    (re.compile(r"/unidades"), ("unidades",)),
+    (re.compile(r"/grupos"), ("grupos",)),
+    (re.compile(r"/stock-bajo"), ("productos", "movimientos", "unidades", "grupos")),
+    (re.compile(r"/api/v1/stock/bajo"), ("productos", "movimientos", "unidades")),
+    (re.compile(r"/api/v1/productos/buscar"), ("productos", "movimientos", "unidades")),
+]
+
+def tablas_de_pagina(request: Request):
+    """Tablas de las que depende la página pedida (None si no usa validación condicional)"""
+    if request.method != "GET":
+        return None
+    for patron, tablas in PAGINAS_CONDICIONALES:
+        if patron.fullmatch(request.url.path):
+            return tablas
+    return None
+
+def respuesta_no_autenticado(es_api: bool):
+    """La API responde 401 en JSON; las páginas redirigen al login"""
+    if es_api:
+        return JSONResponse(
+            {"detail": "No se pudieron validar las credenciales"},
+            status_code=401,
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return RedirectResponse(url="/login", status_code=303)
+
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
     """Middleware para verificar autenticación en rutas protegidas"""
     # Rutas que no requieren autenticación
-    public_routes = ["/login", "/static", "/docs", "/openapi.json", "/favicon.ico"]
+    public_routes = ["/login", "/static", "/docs", "/openapi.json", "/favicon.ico", "/api/v1/token"]
     
     if any(request.url.path.startswith(route) for route in public_routes):
         response = await call_next(request)
         return response
     
-    # Verificar token en cookie
+    # Verificar token en cookie; los clientes de la API lo envían como Bearer
+    es_api = request.url.path.startswith("/api/")
     token = request.cookies.get("access_token")
+    autorizacion = request.headers.get("authorization", "")
+    if es_api and autorizacion.lower().startswith("bearer "):
+        token = autorizacion[7:].strip()
     if not token:
-        return RedirectResponse(url="/login", status_code=303)
+        return respuesta_no_autenticado(es_api)
     
     # Verificar token (simplificado para middleware)
     try:
         from auth import verify_token
         token_data = verify_token(token)
-        
-        # Agregar usuario a la request para uso posterior
-        db = SessionLocal()
-        try:
-            user = db.query(Usuario).filter(Usuario.username == token_data.username).first()
-            if user and user.activo:
-                request.state.current_user = user
-            else:
-                return RedirectResponse(url="/login", status_code=303)
-        finally:
-            db.close()
-            
     except Exception as e:
         print(f"Error en middleware de auth: {e}")
-        return RedirectResponse(url="/login", status_code=303)
+        return respuesta_no_autenticado(es_api)
     
-    response = await call_next(request)
-    return response
+    # Sesión de base de datos de la request: la reutilizan los handlers vía get_db
+    db = SessionLocal()
+    request.state.db = db
+    try:
+        # Agregar usuario a la request para uso posterior (queda asociado a la sesión)
+        user = await run_in_threadpool(buscar_usuario_activo, db, token_data.username)
+        if not user:
+            return respuesta_no_autenticado(es_api)
+        request.state.current_user = user
+        registrar_acceso(user.id)
+        
+        # Validación condicional: si el navegador ya tiene la versión actual, 304 sin
+        # ejecutar las consultas de la página ni renderizar la plantilla
+        tablas = tablas_de_pagina(request)
+        validador = None
+        if tablas:
+            validador = await run_in_threadpool(
+                ValidadorPagina, db, tablas, f"{request.url.path}?{request.url.query}", user.id, user.rol
+            )
+            if validador.no_modificada(
+                request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+            ):
+                return Response(status_code=304, headers=validador.cabeceras())
+        
+        response = await call_next(request)
+        if validador and response.status_code == 200:
+            response.headers.update(validador.cabeceras())
+        return response
+    finally:
+        # Las respuestas en streaming siguen leyendo de la sesión y la cierran al terminar
+        if not getattr(request.state, "db_en_streaming", False):
+            await run_in_threadpool(db.close)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tareas de mantenimiento de la base de datos de inventario
+Ejecutar: python mantenimiento.py <comando>
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import delete
+from database import SessionLocal, engine, Base
+from models import CierreStock
+from cache import incrementar_version
+from stock import reconstruir_stock, generar_cierres, PERIODO_CIERRE, PERIODOS_CIERRE
+from busqueda import reconstruir_indice_busqueda
+from migraciones import aplicar_migraciones, version_actual, VERSION_ESQUEMA
+
+def comando_reconstruir_stock(args):
+    """Recalcular los saldos materializados desde la tabla de movimientos"""
+    print("🔄 Reconstruyendo saldos de stock desde movimientos...")
+    inicio = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        total = reconstruir_stock(db)
+        # Invalida el resumen del dashboard en los workers que estén corriendo
+        incrementar_version(db, "movimientos")
+        db.commit()
+    except Exception as e:
+        print(f"❌ Error al reconstruir saldos: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+    print(f"✅ Saldos reconstruidos: {total} productos ({time.perf_counter() - inicio:.2f}s)")
+    return True
+
+def comando_cierres(args):
+    """Generar los saldos de cierre de los períodos terminados"""
+    hasta = datetime.strptime(args.hasta, "%Y-%m-%d").date() if args.hasta else None
+    print(f"📅 Generando cierres de stock ({args.periodo})...")
+    inicio = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        if args.regenerar:
+            print("🧹 Eliminando cierres anteriores...")
+            db.execute(delete(CierreStock))
+        total = generar_cierres(db, hasta=hasta, periodo=args.periodo)
+    except Exception as e:
+        print(f"❌ Error al generar cierres: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+    print(f"✅ Cierres generados: {total} ({time.perf_counter() - inicio:.2f}s)")
+    return True
+
+def comando_reindexar_busqueda(args):
+    """Reconstruir el índice de búsqueda de productos desde la tabla productos"""
+    print("🔎 Reconstruyendo índice de búsqueda de productos...")
+    inicio = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        if not reconstruir_indice_busqueda(db):
+            print("⚠️  No hay índice FTS5 (aplica las migraciones o SQLite no incluye FTS5): la búsqueda recorre la tabla de productos")
+            return False
+        db.commit()
+    except Exception as e:
+        print(f"❌ Error al reconstruir el índice: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+    print(f"✅ Índice de búsqueda reconstruido ({time.perf_counter() - inicio:.2f}s)")
+    return True
+
+def comando_migrar(args):
+    """Aplicar las migraciones de esquema pendientes"""
+    print(f"🛠️  Versión de esquema: {version_actual(engine)} (última disponible: {VERSION_ESQUEMA})")
+    try:
+        aplicadas = aplicar_migraciones(engine)
+    except Exception as e:
+        print(f"❌ Error al aplicar migraciones: {e}")
+        return False
+
+    if aplicadas:
+        print(f"✅ Migraciones aplicadas: {', '.join(str(numero) for numero in aplicadas)}")
+    else:
+        print("✅ La base de datos ya está actualizada")
+    return True
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos de inventario")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_migrar = subparsers.add_parser("migrar", help="Aplicar migraciones de esquema pendientes")
+    parser_migrar.set_defaults(funcion=comando_migrar)
+
+    parser_stock = subparsers.add_parser("reconstruir-stock", help="Recalcular saldos desde movimientos")
+    parser_stock.set_defaults(funcion=comando_reconstruir_stock)
+
+    parser_busqueda = subparsers.add_parser("reindexar-busqueda", help="Reconstruir el índice de búsqueda de productos")
+    parser_busqueda.set_defaults(funcion=comando_reindexar_busqueda)
+
+    parser_cierres = subparsers.add_parser("cierres", help="Generar saldos de cierre por período")
+    parser_cierres.add_argument("--hasta", help="Fecha de cierre máxima (AAAA-MM-DD), por defecto el último período terminado")
+    parser_cierres.add_argument("--periodo", choices=PERIODOS_CIERRE, default=PERIODO_CIERRE)
+    parser_cierres.add_argument("--regenerar", action="store_true", help="Eliminar los cierres existentes y volver a calcularlos")
+    parser_cierres.set_defaults(funcion=comando_cierres)
+
+    args = parser.parse_args()
+
+    # Crear tablas si no existen
+    Base.metadata.create_all(bind=engine)
+
+    # Código de salida distinto de 0 si el comando falla (para scripts y despliegues)
+    sys.exit(0 if args.funcion(args) else 1)
+
+if __name__ == "__main__":
+    main()
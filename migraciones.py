@@ -0,0 +1,127 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+
+Base.metadata.create_all solo crea tablas nuevas: no agrega índices ni columnas a una
+base de datos que ya existe. Cada migración se aplica una sola vez y queda registrada
+en la tabla schema_version.
+"""
+
+import time
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+def _m001_indices_movimientos(conexion):
+    """Índices compuestos para kardex, filtros por fecha y paginación de movimientos"""
+    conexion.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movimientos_producto_fecha "
+        "ON movimientos (producto_id, fecha, fecha_creacion)"
+    ))
+    conexion.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movimientos_fecha "
+        "ON movimientos (fecha, fecha_creacion)"
+    ))
+
+def _m002_poblar_saldos(conexion):
+    """Poblar stock_productos en bases de datos anteriores a los saldos materializados"""
+    from stock import asegurar_saldos
+    with Session(bind=conexion) as db:
+        asegurar_saldos(db)
+
+def _m003_versiones_datos(conexion):
+    """Tabla de versiones por tabla para invalidar las cachés en memoria"""
+    from models import VersionDatos
+    VersionDatos.__table__.create(bind=conexion, checkfirst=True)
+
+def _m004_indice_busqueda(conexion):
+    """Índice FTS5 de código y nombre de productos, sincronizado con triggers"""
+    from busqueda import crear_indice_busqueda
+    crear_indice_busqueda(conexion)
+
+def _m005_marca_stock_bajo(conexion):
+    """Marca de stock bajo materializada en stock_productos, con índice parcial"""
+    from stock import actualizar_stock_bajo
+    columnas = {fila[1] for fila in conexion.execute(text("PRAGMA table_info(stock_productos)"))}
+    if "stock_bajo" not in columnas:
+        conexion.execute(text("ALTER TABLE stock_productos ADD COLUMN stock_bajo BOOLEAN NOT NULL DEFAULT 0"))
+    conexion.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_stock_productos_bajo "
+        "ON stock_productos (producto_id) WHERE stock_bajo = 1"
+    ))
+    actualizar_stock_bajo(conexion)
+
+# (versión, descripción, función) en orden de aplicación; nunca modificar una ya publicada.
+# Como el inicio omite create_all si el esquema está al día, toda tabla nueva necesita
+# también su migración
+MIGRACIONES = [
+    (1, "Índices de movimientos por producto y fecha", _m001_indices_movimientos),
+    (2, "Poblar saldos materializados de stock", _m002_poblar_saldos),
+    (3, "Tabla de versiones de datos para cachés", _m003_versiones_datos),
+    (4, "Índice de búsqueda de productos (FTS5)", _m004_indice_busqueda),
+    (5, "Marca de stock bajo en los saldos", _m005_marca_stock_bajo),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+def _crear_tabla_version(conexion):
+    """Crear la tabla de control de versiones si no existe"""
+    conexion.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "descripcion VARCHAR(200) NOT NULL, "
+        "fecha_aplicacion DATETIME NOT NULL)"
+    ))
+
+def version_actual(engine) -> int:
+    """Última versión de esquema aplicada (0 si nunca se migró)
+
+    Solo lee: cada worker la consulta al iniciar y no debe abrir una transacción de
+    escritura. La tabla schema_version se crea en aplicar_migraciones.
+    """
+    with engine.connect() as conexion:
+        existe = conexion.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+        ).first()
+        if existe is None:
+            return 0
+        return conexion.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+def aplicar_migraciones(engine) -> list:
+    """Aplicar las migraciones pendientes y actualizar estadísticas con ANALYZE"""
+    with engine.begin() as conexion:
+        _crear_tabla_version(conexion)
+    version = version_actual(engine)
+    aplicadas = []
+
+    for numero, descripcion, funcion in MIGRACIONES:
+        if numero <= version:
+            continue
+        inicio = time.perf_counter()
+        # Cada migración y su registro van en la misma transacción
+        with engine.begin() as conexion:
+            funcion(conexion)
+            conexion.execute(
+                text("INSERT INTO schema_version (version, descripcion, fecha_aplicacion) VALUES (:v, :d, :f)"),
+                {"v": numero, "d": descripcion, "f": datetime.now()}
+            )
+        print(f"🛠️  Migración {numero} aplicada: {descripcion} ({time.perf_counter() - inicio:.2f}s)")
+        aplicadas.append(numero)
+
+    if aplicadas:
+        # Estadísticas para que el planificador use los índices nuevos
+        with engine.begin() as conexion:
+            conexion.execute(text("ANALYZE"))
+
+    return aplicadas
+
+def esquema_actualizado(engine) -> bool:
+    """Verificación rápida: ¿están aplicadas todas las migraciones?"""
+    return version_actual(engine) >= VERSION_ESQUEMA
+
+def preparar_base_datos(engine) -> list:
+    """Crear las tablas que falten y aplicar las migraciones pendientes"""
+    from database import Base
+    import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+    Base.metadata.create_all(bind=engine)
+    return aplicar_migraciones(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 from database import Base
@@ -65,9 +65,16 @@ class Producto(Base):
     unidad_rel = relationship("Unidad", back_populates="productos")
     grupo_rel = relationship("Grupo", back_populates="productos")
     movimientos = relationship("Movimiento", back_populates="producto")
+    stock = relationship("StockProducto", back_populates="producto", uselist=False)
 
 class Movimiento(Base):
     __tablename__ = "movimientos"
+    __table_args__ = (
+        # Kardex y filtros por producto/fecha; el listado general ordena por fecha
+        # (las bases existentes los reciben con migraciones.py)
+        Index("ix_movimientos_producto_fecha", "producto_id", "fecha", "fecha_creacion"),
+        Index("ix_movimientos_fecha", "fecha", "fecha_creacion"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
@@ -79,3 +86,42 @@ class Movimiento(Base):
     
     # Relación con producto
     producto = relationship("Producto", back_populates="movimientos")
+
+class StockProducto(Base):
+    __tablename__ = "stock_productos"
+    __table_args__ = (
+        # Índice parcial: solo contiene los productos con stock bajo
+        Index("ix_stock_productos_bajo", "producto_id", sqlite_where=text("stock_bajo = 1")),
+    )
+    
+    # Saldo materializado: se actualiza en la misma transacción que cada movimiento
+    producto_id = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    cantidad = Column(Float, nullable=False, default=0.0)
+    # cantidad <= stock_minimo del producto (con mínimo mayor que cero); se actualiza
+    # junto con la cantidad y al cambiar el stock mínimo
+    stock_bajo = Column(Boolean, nullable=False, default=False)
+    fecha_actualizacion = Column(DateTime, default=datetime.now)
+    
+    # Relación con producto
+    producto = relationship("Producto", back_populates="stock")
+
+class CierreStock(Base):
+    __tablename__ = "cierres_stock"
+    __table_args__ = (
+        UniqueConstraint("producto_id", "fecha_cierre", name="uq_cierres_stock_producto_fecha"),
+    )
+    
+    # Saldo de un producto al cierre de un período (incluye todos los movimientos hasta fecha_cierre)
+    id = Column(Integer, primary_key=True, index=True)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
+    fecha_cierre = Column(Date, nullable=False)
+    saldo = Column(Float, nullable=False)
+    fecha_creacion = Column(DateTime, default=datetime.now)
+
+class VersionDatos(Base):
+    __tablename__ = "versiones_datos"
+    
+    # Contador de cambios por tabla: invalida las cachés en memoria de todos los workers
+    tabla = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    actualizado = Column(DateTime, default=datetime.now)
@@ -0,0 +1,64 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Tuple
+from sqlalchemy import tuple_
+from models import Movimiento
+
+def codificar_cursor(valores: list) -> str:
+    """Codificar los valores de la última fila de una página como cursor opaco"""
+    texto = json.dumps(valores, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decodificar_cursor(cursor: str) -> list:
+    """Decodificar un cursor generado con codificar_cursor (lanza ValueError si es inválido)"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+    if not isinstance(valores, list):
+        raise ValueError("Cursor de paginación inválido")
+    return valores
+
+def cursor_id(id_: int) -> str:
+    """Cursor para listados ordenados por id"""
+    return codificar_cursor([id_])
+
+def leer_cursor_id(cursor: str) -> int:
+    """Obtener el id desde un cursor generado con cursor_id"""
+    valores = decodificar_cursor(cursor)
+    if len(valores) != 1 or not isinstance(valores[0], int):
+        raise ValueError("Cursor de paginación inválido")
+    return valores[0]
+
+# Los movimientos se ordenan por (fecha, fecha_creacion, id): el id desempata movimientos simultáneos
+
+def orden_movimientos_desc():
+    """Orden de los movimientos del más reciente al más antiguo"""
+    return (Movimiento.fecha.desc(), Movimiento.fecha_creacion.desc(), Movimiento.id.desc())
+
+def orden_movimientos_asc():
+    """Orden cronológico de los movimientos"""
+    return (Movimiento.fecha.asc(), Movimiento.fecha_creacion.asc(), Movimiento.id.asc())
+
+def cursor_movimiento(movimiento: Movimiento) -> str:
+    """Cursor que apunta a un movimiento"""
+    return codificar_cursor([
+        movimiento.fecha.isoformat(),
+        movimiento.fecha_creacion.isoformat(),
+        movimiento.id
+    ])
+
+def leer_cursor_movimiento(cursor: str) -> Tuple[date, datetime, int]:
+    """Obtener (fecha, fecha_creacion, id) desde un cursor de movimiento"""
+    valores = decodificar_cursor(cursor)
+    try:
+        fecha, fecha_creacion, movimiento_id = valores
+        return date.fromisoformat(fecha), datetime.fromisoformat(fecha_creacion), int(movimiento_id)
+    except (TypeError, ValueError):
+        raise ValueError("Cursor de paginación inválido")
+
+def anteriores_a(clave: Tuple[date, datetime, int]):
+    """Condición SQL para los movimientos anteriores a la clave (fecha, fecha_creacion, id)"""
+    return tuple_(Movimiento.fecha, Movimiento.fecha_creacion, Movimiento.id) < tuple_(*clave)
@@ -0,0 +1,102 @@
+import os
+from typing import Callable, Iterable, Iterator, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+# Plantillas compiladas que se conservan entre reinicios (se invalidan solas si cambia el .html)
+DIRECTORIO_CACHE_PLANTILLAS = os.getenv("INVENTARIO_CACHE_PLANTILLAS", "cache_plantillas")
+
+# Tamaño aproximado (caracteres) de cada bloque enviado al navegador
+TAMANO_BLOQUE_STREAMING = 16 * 1024
+
+def crear_templates(directorio: str = "templates") -> Jinja2Templates:
+    """Jinja2Templates con caché de bytecode en disco"""
+    templates = Jinja2Templates(directory=directorio)
+    os.makedirs(DIRECTORIO_CACHE_PLANTILLAS, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(DIRECTORIO_CACHE_PLANTILLAS)
+    return templates
+
+templates = crear_templates()
+
+class FilasEnStreaming:
+    """Filas de una consulta que se leen de la base de datos mientras se renderiza la plantilla
+
+    La primera fila se lee al crearla, así los errores de la consulta ocurren antes de
+    enviar la respuesta y la plantilla puede usar {% if filas %}. Con limite, la iteración
+    se detiene al completar la página y siguiente_cursor queda disponible al terminar el
+    bucle (la consulta debe pedir limite + 1 filas).
+    """
+
+    def __init__(self, filas: Iterable, limite: Optional[int] = None, cursor_de: Optional[Callable] = None):
+        self._filas = iter(filas)
+        self._primera = next(self._filas, None)
+        self.limite = limite
+        self.cursor_de = cursor_de
+        self.siguiente_cursor = None
+
+    def __bool__(self):
+        return self._primera is not None
+
+    def __iter__(self):
+        if self._primera is None:
+            return
+        anterior = self._primera
+        yield anterior
+        leidas = 1
+        for fila in self._filas:
+            if self.limite is not None and leidas >= self.limite:
+                self.siguiente_cursor = self.cursor_de(anterior) if self.cursor_de else None
+                return
+            yield fila
+            anterior = fila
+            leidas += 1
+
+def _cerrar_sesion_al_terminar(contenido: Iterable, db) -> Iterator:
+    """Enviar el contenido y cerrar la sesión al final, también si falla a mitad
+
+    Starlette no ejecuta las tareas de fondo si el iterador lanza una excepción, así que
+    el cierre no puede quedar en un BackgroundTask.
+    """
+    try:
+        yield from contenido
+    finally:
+        db.close()
+
+def respuesta_con_sesion(
+    request: Request,
+    contenido: Iterable,
+    media_type: str,
+    headers: Optional[dict] = None
+) -> StreamingResponse:
+    """StreamingResponse que lee de la sesión de la request mientras se envía
+
+    La sesión sigue abierta hasta terminar de enviar la respuesta (o hasta que falle la
+    plantilla o la consulta) y se cierra al final; el middleware no la cierra antes.
+    """
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        request.state.db_en_streaming = True
+        contenido = _cerrar_sesion_al_terminar(contenido, db)
+    return StreamingResponse(contenido, media_type=media_type, headers=headers)
+
+def respuesta_streaming(request: Request, nombre: str, contexto: dict) -> StreamingResponse:
+    """Renderizar la plantilla por partes con generate(), enviando cada bloque al producirse"""
+    plantilla = templates.get_template(nombre)
+    contexto = {"request": request, **contexto}
+
+    def generar():
+        bloque = []
+        tamano = 0
+        for parte in plantilla.generate(contexto):
+            bloque.append(parte)
+            tamano += len(parte)
+            if tamano >= TAMANO_BLOQUE_STREAMING:
+                yield "".join(bloque)
+                bloque = []
+                tamano = 0
+        if bloque:
+            yield "".join(bloque)
+
+    return respuesta_con_sesion(request, generar(), media_type="text/html; charset=utf-8")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import date, datetime
-from typing import Optional
+from typing import Generic, List, Optional, TypeVar
 from enum import Enum
 
 class RolUsuario(str, Enum):
@@ -113,3 +113,52 @@ class Movimiento(MovimientoBase):
     
     class Config:
         from_attributes = True
+
+# Schemas de la API JSON (/api/v1)
+class ProductoStock(Producto):
+    activo: bool
+    stock_actual: float
+    stock_bajo: bool
+
+class SaldoStock(BaseModel):
+    producto_id: int
+    codigo: str
+    stock_actual: float
+    stock_minimo: float
+    stock_bajo: bool
+
+class ProductoStockBajo(BaseModel):
+    producto_id: int
+    codigo: str
+    nombre: str
+    unidad: Optional[str] = None
+    stock_actual: float
+    stock_minimo: float
+    faltante: float
+
+class SugerenciaProducto(BaseModel):
+    id: int
+    codigo: str
+    nombre: str
+    unidad: Optional[str] = None
+    stock_actual: float
+
+class MovimientoKardex(Movimiento):
+    saldo: float
+
+T = TypeVar("T")
+
+class Pagina(BaseModel, Generic[T]):
+    items: List[T]
+    siguiente_cursor: Optional[str] = None
+
+class ResultadoLinea(BaseModel):
+    linea: int
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    insertados: int
+    rechazados: int
+    resultados: List[ResultadoLinea]
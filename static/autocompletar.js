@@ -0,0 +1,112 @@
+// Autocompletar productos con la búsqueda del servidor (/api/v1/productos/buscar)
+// Uso: autocompletarProductos(input, { alElegir: function(producto) { ... } })
+
+function autocompletarProductos(input, opciones) {
+    opciones = opciones || {};
+    const espera = opciones.espera || 200;       // ms sin escribir antes de consultar
+    const minimo = opciones.minimo || 2;         // caracteres mínimos
+    const lista = document.createElement('ul');
+    lista.className = 'sugerencias';
+    lista.style.display = 'none';
+    input.parentElement.style.position = 'relative';
+    input.parentElement.appendChild(lista);
+    input.setAttribute('autocomplete', 'off');
+
+    let temporizador = null;
+    let controlador = null;
+    let resultados = [];
+    let seleccionada = -1;
+
+    function cerrar() {
+        lista.style.display = 'none';
+        seleccionada = -1;
+    }
+
+    function elegir(indice) {
+        const producto = resultados[indice];
+        if (!producto) return;
+        cerrar();
+        if (opciones.alElegir) opciones.alElegir(producto);
+    }
+
+    function marcar(indice) {
+        const items = lista.querySelectorAll('li');
+        items.forEach(function(item, i) {
+            item.classList.toggle('activa', i === indice);
+        });
+        seleccionada = indice;
+    }
+
+    function mostrar(productos) {
+        resultados = productos;
+        lista.innerHTML = '';
+        if (!productos.length) {
+            const vacio = document.createElement('li');
+            vacio.className = 'sin-resultados';
+            vacio.textContent = '🔍 Sin coincidencias';
+            lista.appendChild(vacio);
+        }
+        productos.forEach(function(producto, indice) {
+            const item = document.createElement('li');
+            const codigo = document.createElement('strong');
+            codigo.textContent = producto.codigo;
+            const detalle = document.createElement('small');
+            detalle.textContent = ` · stock ${formatearNumero(producto.stock_actual)} ${producto.unidad || ''}`;
+            item.appendChild(codigo);
+            item.appendChild(document.createTextNode(' - ' + producto.nombre));
+            item.appendChild(detalle);
+            // mousedown: se ejecuta antes del blur del input
+            item.addEventListener('mousedown', function(event) {
+                event.preventDefault();
+                elegir(indice);
+            });
+            lista.appendChild(item);
+        });
+        seleccionada = -1;
+        lista.style.top = (input.offsetTop + input.offsetHeight) + 'px';
+        lista.style.display = 'block';
+    }
+
+    function consultar() {
+        const texto = input.value.trim();
+        if (texto.length < minimo) {
+            cerrar();
+            return;
+        }
+        // Cancelar la consulta anterior si el usuario siguió escribiendo
+        if (controlador) controlador.abort();
+        controlador = new AbortController();
+        const parametros = new URLSearchParams({ q: texto });
+        if (opciones.incluirInactivos) parametros.set('incluir_inactivos', 'true');
+        fetch('/api/v1/productos/buscar?' + parametros.toString(), { signal: controlador.signal })
+            .then(function(respuesta) { return respuesta.ok ? respuesta.json() : []; })
+            .then(mostrar)
+            .catch(function(error) {
+                if (error.name !== 'AbortError') cerrar();
+            });
+    }
+
+    input.addEventListener('input', function() {
+        if (opciones.alEscribir) opciones.alEscribir();
+        clearTimeout(temporizador);
+        temporizador = setTimeout(consultar, espera);
+    });
+
+    input.addEventListener('keydown', function(event) {
+        if (lista.style.display === 'none' || !resultados.length) return;
+        if (event.key === 'ArrowDown') {
+            event.preventDefault();
+            marcar(Math.min(seleccionada + 1, resultados.length - 1));
+        } else if (event.key === 'ArrowUp') {
+            event.preventDefault();
+            marcar(Math.max(seleccionada - 1, 0));
+        } else if (event.key === 'Enter' && seleccionada >= 0) {
+            event.preventDefault();
+            elegir(seleccionada);
+        } else if (event.key === 'Escape') {
+            cerrar();
+        }
+    });
+
+    input.addEventListener('blur', cerrar);
+}
@@ -0,0 +1,455 @@
+import os
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session, joinedload
+from database import bloquear_escritura
+from models import Producto, Movimiento, StockProducto, CierreStock
+from cache import incrementar_version
+from paginacion import orden_movimientos_asc, orden_movimientos_desc, anteriores_a
+
+# Movimientos por página del kardex
+TAMANO_PAGINA_KARDEX = 50
+
+# Período de los cierres de stock: "mensual" o "semanal"
+PERIODO_CIERRE = os.getenv("INVENTARIO_PERIODO_CIERRE", "mensual")
+PERIODOS_CIERRE = ("mensual", "semanal")
+
+def signo_movimiento(tipo: str) -> int:
+    """Signo con el que un movimiento afecta al stock ("entrada" suma, el resto resta)"""
+    return 1 if tipo == "entrada" else -1
+
+def cantidad_con_signo():
+    """Expresión SQL con la cantidad del movimiento con su signo según el tipo"""
+    return case((Movimiento.tipo == "entrada", Movimiento.cantidad), else_=-Movimiento.cantidad)
+
+def _minimo_del_producto(saldos):
+    """Subconsulta correlacionada con el stock mínimo del producto de cada saldo"""
+    return (
+        select(func.coalesce(Producto.stock_minimo, 0.0))
+        .where(Producto.id == saldos.c.producto_id)
+        .scalar_subquery()
+    )
+
+def _stock_bajo_con(saldos, cantidad):
+    """Expresión SQL de la marca de stock bajo para la cantidad indicada"""
+    minimo = _minimo_del_producto(saldos)
+    return and_(minimo > 0, cantidad <= minimo)
+
+def actualizar_stock_bajo(db, producto_ids: Optional[Iterable[int]] = None):
+    """Recalcular la marca de stock bajo de algunos (o todos) los saldos (sin commit)
+
+    Acepta una sesión o una conexión. Se usa al cambiar el stock mínimo de un producto;
+    los movimientos actualizan la marca en el mismo UPDATE que la cantidad.
+    """
+    saldos = StockProducto.__table__
+    sentencia = update(saldos).values(stock_bajo=_stock_bajo_con(saldos, saldos.c.cantidad))
+    if producto_ids is None:
+        db.execute(sentencia)
+        return
+    producto_ids = list(producto_ids)
+    if producto_ids:
+        db.execute(
+            sentencia.where(saldos.c.producto_id == bindparam("b_producto_id")),
+            [{"b_producto_id": producto_id} for producto_id in producto_ids]
+        )
+
+def inicializar_stock(db: Session, producto_id: int, cantidad: float = 0.0):
+    """Crear el saldo materializado de un producto nuevo"""
+    db.execute(
+        insert(StockProducto).values(
+            producto_id=producto_id,
+            cantidad=cantidad,
+            fecha_actualizacion=datetime.now()
+        )
+    )
+    actualizar_stock_bajo(db, [producto_id])
+
+def inicializar_stock_lote(db: Session, cantidades: Dict[int, float]):
+    """Crear los saldos de varios productos nuevos en un solo executemany"""
+    if not cantidades:
+        return
+    ahora = datetime.now()
+    db.execute(
+        insert(StockProducto),
+        [
+            {"producto_id": producto_id, "cantidad": cantidad, "fecha_actualizacion": ahora}
+            for producto_id, cantidad in cantidades.items()
+        ]
+    )
+    actualizar_stock_bajo(db, cantidades)
+
+def aplicar_movimiento_stock(db: Session, producto_id: int, tipo: str, cantidad: float):
+    """Sumar o restar un movimiento al saldo materializado (sin hacer commit)"""
+    delta = signo_movimiento(tipo) * cantidad
+    saldos = StockProducto.__table__
+    # La marca de stock bajo se recalcula en el mismo UPDATE, con la cantidad nueva
+    resultado = db.execute(
+        update(saldos)
+        .where(saldos.c.producto_id == producto_id)
+        .values(
+            cantidad=saldos.c.cantidad + delta,
+            stock_bajo=_stock_bajo_con(saldos, saldos.c.cantidad + delta),
+            fecha_actualizacion=datetime.now()
+        )
+    )
+    if resultado.rowcount == 0:
+        inicializar_stock(db, producto_id, delta)
+
+def registrar_movimiento(db: Session, movimiento: Movimiento) -> Movimiento:
+    """Agregar un movimiento y actualizar el saldo en la misma transacción"""
+    db.add(movimiento)
+    aplicar_movimiento_stock(db, movimiento.producto_id, movimiento.tipo, movimiento.cantidad)
+    invalidar_cierres(db, movimiento.producto_id, movimiento.fecha)
+    incrementar_version(db, "movimientos")
+    return movimiento
+
+def registrar_movimientos_lote(db: Session, lineas: List[dict]) -> List[int]:
+    """Insertar varios movimientos con executemany y actualizar saldos y cierres (sin commit)
+
+    Cada línea es un dict con producto_id, tipo, cantidad, descripcion y fecha de
+    productos ya validados. Devuelve los ids en el mismo orden de las líneas.
+    """
+    if not lineas:
+        return []
+    ahora = datetime.now()
+    ids = db.execute(
+        insert(Movimiento).returning(Movimiento.id, sort_by_parameter_order=True),
+        [{**linea, "fecha_creacion": ahora} for linea in lineas]
+    ).scalars().all()
+
+    # Un UPDATE por producto (no por línea) con el total del lote
+    deltas = {}
+    fechas_minimas = {}
+    for linea in lineas:
+        producto_id = linea["producto_id"]
+        deltas[producto_id] = deltas.get(producto_id, 0.0) + signo_movimiento(linea["tipo"]) * linea["cantidad"]
+        fechas_minimas[producto_id] = min(linea["fecha"], fechas_minimas.get(producto_id, linea["fecha"]))
+
+    con_saldo = set(db.execute(
+        select(StockProducto.producto_id).where(StockProducto.producto_id.in_(list(deltas)))
+    ).scalars())
+    for producto_id in deltas.keys() - con_saldo:
+        inicializar_stock(db, producto_id)
+
+    saldos = StockProducto.__table__
+    db.execute(
+        update(saldos)
+        .where(saldos.c.producto_id == bindparam("b_producto_id"))
+        .values(
+            cantidad=saldos.c.cantidad + bindparam("b_delta"),
+            stock_bajo=_stock_bajo_con(saldos, saldos.c.cantidad + bindparam("b_delta")),
+            fecha_actualizacion=ahora
+        ),
+        [{"b_producto_id": producto_id, "b_delta": delta} for producto_id, delta in deltas.items()]
+    )
+
+    cierres = CierreStock.__table__
+    db.execute(
+        delete(cierres).where(
+            cierres.c.producto_id == bindparam("b_producto_id"),
+            cierres.c.fecha_cierre >= bindparam("b_fecha")
+        ),
+        [{"b_producto_id": producto_id, "b_fecha": fecha} for producto_id, fecha in fechas_minimas.items()]
+    )
+    incrementar_version(db, "movimientos")
+    return list(ids)
+
+def obtener_stock(db: Session, producto_id: int) -> float:
+    """Leer el saldo materializado de un producto"""
+    cantidad = db.execute(
+        select(StockProducto.cantidad).where(StockProducto.producto_id == producto_id)
+    ).scalar()
+    return cantidad or 0.0
+
+def calcular_stock_bulk(db: Session, producto_ids: Optional[Iterable[int]] = None) -> Dict[int, float]:
+    """Sumar el stock desde movimientos para todos (o algunos) productos en una sola consulta"""
+    consulta = select(Movimiento.producto_id, func.sum(cantidad_con_signo())).group_by(Movimiento.producto_id)
+    if producto_ids is not None:
+        consulta = consulta.where(Movimiento.producto_id.in_(list(producto_ids)))
+    return {producto_id: total or 0.0 for producto_id, total in db.execute(consulta).all()}
+
+def _columnas_stock():
+    """Saldo actual y marca de stock bajo (materializada en stock_productos)"""
+    stock_actual = func.coalesce(StockProducto.cantidad, 0.0)
+    # Misma forma que el índice parcial ix_stock_productos_bajo, para que SQLite lo use
+    stock_bajo = StockProducto.stock_bajo == True
+    return stock_actual, stock_bajo
+
+def obtener_stock_productos(
+    db: Session,
+    producto_ids: Optional[Iterable[int]] = None,
+    solo_activos: bool = False,
+    solo_stock_bajo: bool = False,
+    por_lotes: Optional[int] = None,
+    despues_de: Optional[int] = None,
+    limite: Optional[int] = None
+):
+    """Productos con su stock actual y marca de stock bajo en una sola consulta
+
+    Devuelve filas (producto, stock_actual, stock_bajo) con unidad y grupo ya cargados.
+    Con por_lotes devuelve un resultado iterable que lee las filas de a ese tamaño.
+    despues_de y limite paginan por id de producto.
+    """
+    stock_actual, stock_bajo = _columnas_stock()
+    consulta = (
+        select(Producto, stock_actual.label("stock_actual"), stock_bajo.label("stock_bajo"))
+        .outerjoin(StockProducto, StockProducto.producto_id == Producto.id)
+        .options(joinedload(Producto.unidad_rel), joinedload(Producto.grupo_rel))
+        .order_by(Producto.id)
+    )
+    if producto_ids is not None:
+        consulta = consulta.where(Producto.id.in_(list(producto_ids)))
+    if solo_activos:
+        consulta = consulta.where(Producto.activo == True)
+    if solo_stock_bajo:
+        consulta = consulta.where(stock_bajo)
+    if despues_de is not None:
+        consulta = consulta.where(Producto.id > despues_de)
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    if por_lotes:
+        return db.execute(consulta.execution_options(yield_per=por_lotes))
+    return db.execute(consulta).all()
+
+def saldos_stock(
+    db: Session,
+    solo_activos: bool = True,
+    solo_stock_bajo: bool = False,
+    despues_de: Optional[int] = None,
+    limite: Optional[int] = None
+):
+    """Saldos sin cargar los productos completos, ordenados por id (para consultas frecuentes)
+
+    Devuelve filas (producto_id, codigo, stock_actual, stock_minimo, stock_bajo).
+    """
+    stock_actual, stock_bajo = _columnas_stock()
+    consulta = (
+        select(
+            Producto.id.label("producto_id"),
+            Producto.codigo,
+            stock_actual.label("stock_actual"),
+            func.coalesce(Producto.stock_minimo, 0.0).label("stock_minimo"),
+            stock_bajo.label("stock_bajo")
+        )
+        .outerjoin(StockProducto, StockProducto.producto_id == Producto.id)
+        .order_by(Producto.id)
+    )
+    if solo_activos:
+        consulta = consulta.where(Producto.activo == True)
+    if solo_stock_bajo:
+        consulta = consulta.where(stock_bajo)
+    if despues_de is not None:
+        consulta = consulta.where(Producto.id > despues_de)
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return db.execute(consulta).all()
+
+def resumen_stock(db: Session):
+    """Total de productos, unidades en stock y cantidad con stock bajo en una sola consulta"""
+    stock_actual, stock_bajo = _columnas_stock()
+    total_productos, stock_total, total_stock_bajo = db.execute(
+        select(
+            func.count(Producto.id),
+            func.coalesce(func.sum(stock_actual), 0.0),
+            func.coalesce(func.sum(case((stock_bajo, 1), else_=0)), 0)
+        ).outerjoin(StockProducto, StockProducto.producto_id == Producto.id)
+    ).one()
+    return total_productos, stock_total, total_stock_bajo
+
+def reconstruir_stock(db: Session) -> int:
+    """Recalcular todos los saldos desde la tabla de movimientos"""
+    # Un movimiento registrado entre la suma y el DELETE quedaría fuera del saldo
+    bloquear_escritura(db)
+    totales = calcular_stock_bulk(db)
+    producto_ids = db.execute(select(Producto.id)).scalars().all()
+
+    db.execute(delete(StockProducto))
+    ahora = datetime.now()
+    if producto_ids:
+        db.execute(
+            insert(StockProducto),
+            [
+                {"producto_id": pid, "cantidad": totales.get(pid) or 0.0, "fecha_actualizacion": ahora}
+                for pid in producto_ids
+            ]
+        )
+        actualizar_stock_bajo(db)
+    db.commit()
+    return len(producto_ids)
+
+def asegurar_saldos(db: Session) -> bool:
+    """Poblar los saldos si la tabla está vacía (bases de datos anteriores a esta tabla)"""
+    hay_saldos = db.execute(select(StockProducto.producto_id).limit(1)).first()
+    hay_productos = db.execute(select(Producto.id).limit(1)).first()
+    if hay_saldos or not hay_productos:
+        return False
+    reconstruir_stock(db)
+    return True
+
+# ===== CIERRES DE PERÍODO =====
+
+def inicio_de_periodo(fecha: date, periodo: str = PERIODO_CIERRE) -> date:
+    """Primer día del período que contiene la fecha"""
+    if periodo == "semanal":
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+def fin_de_periodo(fecha: date, periodo: str = PERIODO_CIERRE) -> date:
+    """Último día del período que contiene la fecha"""
+    if periodo == "semanal":
+        return inicio_de_periodo(fecha, periodo) + timedelta(days=6)
+    siguiente_mes = (fecha.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return siguiente_mes - timedelta(days=1)
+
+def ultimo_cierre_completo(hoy: Optional[date] = None, periodo: str = PERIODO_CIERRE) -> date:
+    """Fecha de cierre del último período ya terminado"""
+    hoy = hoy or date.today()
+    return inicio_de_periodo(hoy, periodo) - timedelta(days=1)
+
+def invalidar_cierres(db: Session, producto_id: int, fecha: date):
+    """Eliminar los cierres que quedan desactualizados por un movimiento con fecha pasada"""
+    db.execute(
+        delete(CierreStock)
+        .where(CierreStock.producto_id == producto_id, CierreStock.fecha_cierre >= fecha)
+        .execution_options(synchronize_session=False)
+    )
+
+def generar_cierres(db: Session, hasta: Optional[date] = None, periodo: str = PERIODO_CIERRE) -> int:
+    """Guardar el saldo de cada producto al cierre de los períodos terminados
+
+    Es incremental: solo recorre los movimientos posteriores al último cierre de cada
+    producto. Se guarda un cierre por cada período en el que el producto tuvo movimientos.
+    """
+    if periodo not in PERIODOS_CIERRE:
+        raise ValueError(f"Período de cierre inválido: {periodo}")
+    hasta = hasta or ultimo_cierre_completo(periodo=periodo)
+
+    # Lecturas e inserción en una sola transacción de escritura: un movimiento con fecha
+    # pasada registrado en medio quedaría fuera del cierre sin invalidarlo
+    bloquear_escritura(db)
+
+    ultimas_fechas = (
+        select(CierreStock.producto_id, func.max(CierreStock.fecha_cierre).label("fecha_cierre"))
+        .group_by(CierreStock.producto_id)
+        .subquery()
+    )
+    saldos = {
+        producto_id: saldo
+        for producto_id, saldo in db.execute(
+            select(CierreStock.producto_id, CierreStock.saldo).join(
+                ultimas_fechas,
+                and_(
+                    ultimas_fechas.c.producto_id == CierreStock.producto_id,
+                    ultimas_fechas.c.fecha_cierre == CierreStock.fecha_cierre
+                )
+            )
+        ).all()
+    }
+
+    # Movimientos aún no cubiertos por un cierre, agrupados por producto y día
+    pendientes = db.execute(
+        select(Movimiento.producto_id, Movimiento.fecha, func.sum(cantidad_con_signo()))
+        .outerjoin(ultimas_fechas, ultimas_fechas.c.producto_id == Movimiento.producto_id)
+        .where(
+            Movimiento.fecha <= hasta,
+            or_(ultimas_fechas.c.fecha_cierre.is_(None), Movimiento.fecha > ultimas_fechas.c.fecha_cierre)
+        )
+        .group_by(Movimiento.producto_id, Movimiento.fecha)
+        .order_by(Movimiento.producto_id, Movimiento.fecha)
+    ).all()
+
+    cierres = {}
+    for producto_id, fecha, cantidad in pendientes:
+        saldos[producto_id] = saldos.get(producto_id, 0.0) + (cantidad or 0.0)
+        cierres[(producto_id, fin_de_periodo(fecha, periodo))] = saldos[producto_id]
+
+    if cierres:
+        ahora = datetime.now()
+        db.execute(
+            insert(CierreStock),
+            [
+                {"producto_id": producto_id, "fecha_cierre": fecha_cierre, "saldo": saldo, "fecha_creacion": ahora}
+                for (producto_id, fecha_cierre), saldo in cierres.items()
+            ]
+        )
+    db.commit()
+    return len(cierres)
+
+def saldo_al(db: Session, producto_id: int, fecha: date) -> float:
+    """Saldo de un producto al final de una fecha: último cierre anterior más los movimientos posteriores"""
+    cierre = db.execute(
+        select(CierreStock.fecha_cierre, CierreStock.saldo)
+        .where(CierreStock.producto_id == producto_id, CierreStock.fecha_cierre <= fecha)
+        .order_by(CierreStock.fecha_cierre.desc())
+        .limit(1)
+    ).first()
+
+    consulta = select(func.sum(cantidad_con_signo())).where(
+        Movimiento.producto_id == producto_id,
+        Movimiento.fecha <= fecha
+    )
+    saldo = 0.0
+    if cierre:
+        saldo = cierre.saldo
+        consulta = consulta.where(Movimiento.fecha > cierre.fecha_cierre)
+    return saldo + (db.execute(consulta).scalar() or 0.0)
+
+def saldo_antes_de(db: Session, movimiento: Movimiento) -> float:
+    """Saldo del producto justo antes de un movimiento (orden: fecha, fecha de creación, id)"""
+    saldo = saldo_al(db, movimiento.producto_id, movimiento.fecha - timedelta(days=1))
+    mismo_dia = db.execute(
+        select(func.sum(cantidad_con_signo())).where(
+            Movimiento.producto_id == movimiento.producto_id,
+            Movimiento.fecha == movimiento.fecha,
+            tuple_(Movimiento.fecha_creacion, Movimiento.id) < tuple_(movimiento.fecha_creacion, movimiento.id)
+        )
+    ).scalar()
+    return saldo + (mismo_dia or 0.0)
+
+# ===== KARDEX =====
+
+def pagina_kardex(
+    db: Session,
+    producto_id: int,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+    anterior_a: Optional[Tuple[date, datetime, int]] = None,
+    limite: int = TAMANO_PAGINA_KARDEX
+):
+    """Una página del kardex, del movimiento más reciente al más antiguo
+
+    El saldo progresivo se calcula en SQL con SUM(...) OVER sobre las filas de la página
+    y se ajusta con el saldo anterior al movimiento más antiguo, de modo que el costo no
+    depende del largo del historial. Devuelve (filas, hay_mas) con filas
+    [{"movimiento": ..., "saldo": ...}].
+    """
+    condiciones = [Movimiento.producto_id == producto_id]
+    if fecha_inicio:
+        condiciones.append(Movimiento.fecha >= fecha_inicio)
+    if fecha_fin:
+        condiciones.append(Movimiento.fecha <= fecha_fin)
+    if anterior_a:
+        condiciones.append(anteriores_a(anterior_a))
+
+    # Se pide una fila extra para saber si hay páginas anteriores
+    pagina = (
+        select(Movimiento.id)
+        .where(*condiciones)
+        .order_by(*orden_movimientos_desc())
+        .limit(limite + 1)
+        .subquery()
+    )
+    acumulado = func.sum(cantidad_con_signo()).over(order_by=orden_movimientos_asc())
+    filas = db.execute(
+        select(Movimiento, acumulado.label("acumulado"))
+        .join(pagina, pagina.c.id == Movimiento.id)
+        .order_by(*orden_movimientos_desc())
+    ).all()
+    if not filas:
+        return [], False
+
+    base = saldo_antes_de(db, filas[-1].Movimiento)
+    kardex = [{"movimiento": fila.Movimiento, "saldo": base + fila.acumulado} for fila in filas]
+    hay_mas = len(kardex) > limite
+    return kardex[:limite], hay_mas
@@ -0,0 +1,40 @@
+import asyncio
+import zlib
+
+from starlette.responses import StreamingResponse
+
+from estaticos import CompresionRespuestas
+
+SCOPE = {
+    "type": "http",
+    "method": "GET",
+    "path": "/",
+    "headers": [(b"accept-encoding", b"gzip")],
+}
+
+def test_streaming_comprimido_envia_cada_bloque():
+    bloque = "<tr><td>fila</td></tr>" * 200
+    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    recibido = []
+    cabeceras = {}
+
+    async def contenido():
+        yield bloque
+        # Al pedir el segundo bloque, el primero ya tiene que haber llegado completo
+        assert "".join(recibido) == bloque
+        yield bloque
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            cabeceras.update(message["headers"])
+        else:
+            recibido.append(descompresor.decompress(message.get("body", b"")).decode())
+
+    app = CompresionRespuestas(StreamingResponse(contenido(), media_type="text/html"))
+    asyncio.run(app(SCOPE, receive, send))
+
+    assert cabeceras[b"content-encoding"] == b"gzip"
+    assert "".join(recibido) + descompresor.flush().decode() == bloque * 2
@@ -0,0 +1,34 @@
+import csv
+import io
+
+from exportar import celda_segura, generar_csv, generar_xlsx
+
+FILAS_PELIGROSAS = [
+    ["=1+2", "+SUM(A1)", "-cmd", "@A1", "\tx", "\rx"],
+    ["VAL-01", "Válvula", -3.5, 0, None, ""],
+]
+
+def test_celda_segura_neutraliza_formulas():
+    assert celda_segura("=HYPERLINK(\"x\")") == "'=HYPERLINK(\"x\")"
+    assert celda_segura("-cmd") == "'-cmd"
+    assert celda_segura("VAL-01") == "VAL-01"
+    assert celda_segura(-3.5) == -3.5
+    assert celda_segura(None) is None
+
+def test_csv_sin_formulas():
+    texto = "".join(generar_csv(["a", "b", "c", "d", "e", "f"], FILAS_PELIGROSAS))
+    filas = list(csv.reader(io.StringIO(texto.lstrip("﻿"), newline="")))
+    assert filas[1] == ["'=1+2", "'+SUM(A1)", "'-cmd", "'@A1", "'\tx", "'\rx"]
+    assert filas[2] == ["VAL-01", "Válvula", "-3.5", "0", "", ""]
+
+def test_xlsx_sin_formulas():
+    from openpyxl import load_workbook
+
+    contenido = b"".join(generar_xlsx("Reporte", ["a", "b", "c", "d", "e", "f"], FILAS_PELIGROSAS))
+    hoja = load_workbook(io.BytesIO(contenido)).active
+    celdas = list(hoja.iter_rows(min_row=2, values_only=True))
+    # XML convierte el \r en \n al leer: basta con que todas empiecen con '
+    assert celdas[0][:4] == ("'=1+2", "'+SUM(A1)", "'-cmd", "'@A1")
+    assert all(valor.startswith("'") for valor in celdas[0])
+    assert all(celda.data_type != "f" for fila in hoja.iter_rows() for celda in fila)
+    assert celdas[1][:3] == ("VAL-01", "Válvula", -3.5)